@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import MyUser, Profile
 from books.models import Books
+from subscriptions.models import BookPurchase
 
 class ProfileInline(admin.StackedInline):
     model = Profile
@@ -20,7 +21,8 @@ class ProfileAdmin(admin.ModelAdmin):
     list_filter = ('user__date_joined',)
 
     def get_purchased_books(self, obj):
-        return ", ".join([book.title for book in obj.purchased_books.all()])
+        purchases = BookPurchase.objects.filter(user_id=obj.user_id).select_related('book')
+        return ", ".join([purchase.book.title for purchase in purchases])
     get_purchased_books.short_description = 'Purchased Books'
 
     def get_bookmarks(self, obj):
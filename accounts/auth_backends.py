@@ -1,22 +1,28 @@
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
 from .models import MyUser
 
 
-class EmailAuthBackend(BaseBackend):
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = MyUser.objects.get(username=username)
-            if user.check_password(password):
-                return user
-        except MyUser.DoesNotExist:
-            user = None
-        try:
-            user = MyUser.objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except MyUser.DoesNotExist:
+class EmailAuthBackend(ModelBackend):
+    """
+    Log in with a username or an email in one indexed query and at most one
+    password check. Inactive users are returned too, so that the login views
+    can tell them to verify their email; ``login()`` is left to the views.
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        login = username or email
+        if not login or password is None:
+            return None
+        users = list(MyUser.objects.filter(Q(email=login) | Q(username=login))[:2])
+        # An email match wins over another account's username.
+        user = next((user for user in users if user.email == login), users[0] if users else None)
+        if user is None:
+            # Hash anyway, so that unknown logins take as long as wrong passwords.
+            MyUser().set_password(password)
             return None
-        return None
+        # check_password rehashes (one UPDATE) when the hash uses other hasher settings.
+        return user if user.check_password(password) else None
 
     def get_user(self, user_id):
         try:
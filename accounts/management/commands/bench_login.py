@@ -0,0 +1,47 @@
+import statistics
+import time
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from accounts.models import MyUser
+
+EMAIL, USERNAME, PASSWORD = 'bench-login@example.com', 'bench-login', 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = 'Measure single-core login throughput and queries per attempt with the configured backends and hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--iterations', type=int, nargs='*',
+                            help='PBKDF2 iteration counts to compare (default: PASSWORD_PBKDF2_ITERATIONS).')
+
+    def measure(self, credentials, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                authenticate(None, **credentials)
+                timings.append(time.perf_counter() - started)
+        return statistics.median(timings), len(queries)
+
+    def handle(self, *args, **options):
+        cases = [
+            ('email, right password', {'username': EMAIL, 'password': PASSWORD}),
+            ('username, right password', {'username': USERNAME, 'password': PASSWORD}),
+            ('API email, right password', {'email': EMAIL, 'password': PASSWORD}),
+            ('wrong password', {'username': EMAIL, 'password': 'wrong'}),
+            ('unknown login', {'username': 'nobody@example.com', 'password': PASSWORD}),
+        ]
+        self.stdout.write(f'{"iterations":>11}  {"case":<28}{"median ms":>11}{"logins/s":>10}{"queries":>9}')
+        for iterations in options['iterations'] or [settings.PASSWORD_PBKDF2_ITERATIONS]:
+            with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations), transaction.atomic():
+                MyUser.objects.create_user(email=EMAIL, username=USERNAME, password=PASSWORD, is_active=True)
+                for label, credentials in cases:
+                    elapsed, queries = self.measure(credentials, options['repeat'])
+                    self.stdout.write(
+                        f'{iterations:>11}  {label:<28}{elapsed * 1000:>11.1f}{1 / elapsed:>10.2f}{queries:>9}'
+                    )
+                transaction.set_rollback(True)
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:36
+
+from django.db import migrations
+
+
+def copy_purchases(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    BookPurchase = apps.get_model('subscriptions', 'BookPurchase')
+
+    purchases = [
+        BookPurchase(user_id=user_id, book_id=book_id)
+        for user_id, book_id in Profile.purchased_books.through.objects.values_list('profile__user_id', 'books_id')
+    ]
+    BookPurchase.objects.bulk_create(purchases, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_purchases, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='profile',
+            name='purchased_books',
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from subscriptions.models import Subscription
+from subscriptions.entitlements import get_entitlements
 
 
 class MyUserManager(BaseUserManager):
@@ -45,10 +46,11 @@ class MyUser(AbstractBaseUser, PermissionsMixin):
 class Profile(models.Model):
     user = models.OneToOneField(MyUser, on_delete=models.CASCADE)
     photo = models.ImageField(upload_to='users/%Y/%m/%d/', blank=True)
-    purchased_books = models.ManyToManyField('books.Books', related_name='purchasers', blank=True)
 
     def __str__(self):
         return f'Profile of {self.user.username}'
 
     def get_active_subscription(self):
+        if not get_entitlements(self.user).has_active_subscription:
+            return None
         return Subscription.objects.filter(user=self.user, end_date__gt=timezone.now()).first()
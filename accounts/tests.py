@@ -1,3 +1,94 @@
-from django.test import TestCase
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from librarysite import throttling
+from .models import MyUser
 
-# Create your tests here.
+
+@override_settings(THROTTLE_RATES={'login': {'ip': '10/min', 'email': '2/min'}, 'password_reset': {'ip': '1/hour'}})
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        MyUser.objects.create_user(email='reader@example.com', username='reader', password='secret', is_active=True)
+
+    def test_login_is_limited_per_email_with_retry_after(self):
+        url = reverse('api_login')
+        for _ in range(2):
+            response = self.client.post(url, {'email': 'reader@example.com', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post(url, {'email': 'Reader@example.com', 'password': 'secret'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Another account from the same address still gets through.
+        response = self.client.post(url, {'email': 'other@example.com', 'password': 'secret'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(throttling.get_rejections(), {'login:email': 1})
+
+    def test_non_object_bodies_are_left_to_the_view(self):
+        response = self.client.post(reverse('api_login'), ['reader@example.com'], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_html_views_answer_429(self):
+        url = reverse('password_reset')
+        self.client.post(url, {'email': 'reader@example.com'})
+        response = self.client.post(url, {'email': 'reader@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SlidingWindowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_previous_window_fades_out(self):
+        for second in range(3):
+            self.assertIsNone(throttling.hit('test', 'ip', '10.0.0.1', '3/min', now=600 + second))
+        retry_after = throttling.hit('test', 'ip', '10.0.0.1', '3/min', now=610)
+        # Halfway through the next window, half of the previous four requests still count.
+        self.assertEqual(retry_after, 80)
+        self.assertIsNone(throttling.hit('test', 'ip', '10.0.0.1', '3/min', now=610 + retry_after))
+        self.assertIsNotNone(throttling.hit('test', 'ip', '10.0.0.1', '3/min', now=691))
+
+
+class EmailAuthBackendTests(TestCase):
+    def setUp(self):
+        self.user = MyUser.objects.create_user(email='reader@example.com', username='reader', password='secret',
+                                               is_active=True)
+
+    def test_username_or_email_in_one_query(self):
+        for login in ('reader', 'reader@example.com'):
+            with self.assertNumQueries(1):
+                self.assertEqual(authenticate(None, username=login, password='secret'), self.user)
+        self.assertEqual(authenticate(None, email='reader@example.com', password='secret'), self.user)
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(None, username='reader', password='wrong'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(None, username='nobody@example.com', password='secret'))
+
+    def test_email_wins_over_another_accounts_username(self):
+        other = MyUser.objects.create_user(email='other@example.com', username='reader@example.com', password='secret')
+        self.assertEqual(authenticate(None, username='reader@example.com', password='secret'), self.user)
+        self.assertEqual(authenticate(None, username='other@example.com', password='secret'), other)
+
+    def test_inactive_users_are_returned(self):
+        MyUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(authenticate(None, username='reader', password='secret').is_active)
+
+    @override_settings(PASSWORD_HASHERS=['accounts.hashers.ConfigurablePBKDF2PasswordHasher'],
+                       PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_old_hashes_are_upgraded_on_login(self):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            MyUser.objects.filter(pk=self.user.pk).update(password=make_password('secret'))
+        with CaptureQueriesContext(connection) as queries:
+            user = authenticate(None, username='reader', password='secret')
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, user.password)
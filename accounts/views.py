@@ -37,6 +37,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from librarysite.throttling import ThrottleMixin
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -67,8 +68,9 @@ def profile_view(request):
     })
 
 
-class UserLoginView(View):
+class UserLoginView(ThrottleMixin, View):
     form_class = LoginForm
+    throttle_scope = 'login'
     template_name = 'accounts/login.html'
 
     def get(self, request):
@@ -97,8 +99,9 @@ class UserLoginView(View):
         return render(request, self.template_name, {'form': form})
 
 
-class UserRegistrationView(FormView):
+class UserRegistrationView(ThrottleMixin, FormView):
     template_name = 'accounts/register.html'
+    throttle_scope = 'register'
     form_class = UserRegistrationForm
     success_url = reverse_lazy('email_check')
 
@@ -194,7 +197,9 @@ class UserLogoutView(LogoutView):
     next_page = reverse_lazy('home')
 
 
-class CustomPasswordResetView(View):
+class CustomPasswordResetView(ThrottleMixin, View):
+    throttle_scope = 'password_reset'
+
     def get(self, request):
         form = PasswordResetForm()
         return render(request, 'registration/password_reset.html', {'form': form})
@@ -217,7 +222,9 @@ class CustomPasswordResetDoneView(View):
         return render(request, 'registration/password_reset_done.html')
 
 
-class CustomPasswordResetConfirmView(View):
+class CustomPasswordResetConfirmView(ThrottleMixin, View):
+    throttle_scope = 'password_reset'
+
     def get(self, request, uidb64, token):
         try:
             uid = force_str(urlsafe_base64_decode(uidb64))
@@ -251,8 +258,9 @@ class CustomPasswordResetConfirmView(View):
 
 
 @method_decorator(login_required, name='dispatch')
-class CustomPasswordChangeView(PasswordChangeView):
+class CustomPasswordChangeView(ThrottleMixin, PasswordChangeView):
     template_name = 'registration/password_change.html'
+    throttle_scope = 'password_change'
     success_url = reverse_lazy('password_reset_complete')
     form_class = PasswordChangeForm
 
@@ -277,6 +285,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = MyUser.objects.all()
     permission_classes = [permissions.AllowAny]
     serializer_class = UserRegistrationSerializer
+    throttle_scope = 'register'
 
     def perform_create(self, serializer):
         user = serializer.save()
@@ -307,6 +316,7 @@ class VerifyEmailApi(APIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
@@ -357,6 +367,7 @@ class ProfileUpdateView(generics.RetrieveUpdateAPIView):
 
 class PasswordChangeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'password_change'
 
     def post(self, request):
         serializer = PasswordChangeSerializer(data=request.data)
@@ -373,6 +384,7 @@ class PasswordChangeView(APIView):
 
 class PasswordResetView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         serializer = PasswordResetSerializer(data=request.data)
@@ -389,6 +401,7 @@ class PasswordResetView(APIView):
 
 class SetNewPasswordView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
 
     def post(self, request, uidb64, token):
         serializer = SetNewPasswordSerializer(data=request.data, context={'uidb64': uidb64, 'token': token})
@@ -1,10 +1,22 @@
 from django.contrib import admin
-from .models import Books, Author
+from .models import Books, Author, BookPdfInfo
+
+
+class BookPdfInfoInline(admin.StackedInline):
+    model = BookPdfInfo
+    fields = ['status', 'page_count', 'thumbnail', 'processed_at', 'error']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Books)
 class BooksAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'price']
+    inlines = [BookPdfInfoInline]
 
 
 @admin.register(Author)
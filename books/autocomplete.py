@@ -0,0 +1,134 @@
+import threading
+import unicodedata
+from bisect import bisect_left
+from django.db import connection
+from django.urls import reverse
+from librarysite import cache as site_cache
+
+NAMESPACES = ('books', 'authors', 'tags')
+KINDS = ('books', 'authors', 'tags')
+# Entries scanned per kind; a name is indexed under several keys.
+SCAN_LIMIT = 500
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        # entries: iterable of (key, kind, id, label); keys need not be normalized yet.
+        # Each kind gets its own sorted keys, so common title prefixes can't crowd out authors and tags.
+        rows = {kind: [] for kind in KINDS}
+        for key, kind, object_id, label in entries:
+            if key:
+                rows[kind].append((normalize(key), object_id, label))
+        self.keys, self.entries = {}, {}
+        for kind, kind_rows in rows.items():
+            kind_rows.sort()
+            self.keys[kind] = [row[0] for row in kind_rows]
+            self.entries[kind] = [row[1:] for row in kind_rows]
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+    def complete(self, prefix, limit=5):
+        prefix = normalize(prefix)
+        results = {kind: [] for kind in KINDS}
+        if not prefix:
+            return results
+
+        for kind, bucket in results.items():
+            keys, entries = self.keys[kind], self.entries[kind]
+            seen = set()
+            pos = bisect_left(keys, prefix)
+            end = min(len(keys), pos + SCAN_LIMIT)
+            while pos < end and len(bucket) < limit and keys[pos].startswith(prefix):
+                object_id, label = entries[pos]
+                pos += 1
+                if object_id not in seen:
+                    seen.add(object_id)
+                    bucket.append((object_id, label))
+        return results
+
+
+def catalog_entries():
+    from taggit.models import Tag
+    from .models import Books, Author
+
+    books = Books.objects.filter(status=Books.Status.PUBLISHED).values_list('id', 'title')
+    for book_id, title in books.iterator(chunk_size=5000):
+        yield title, 'books', book_id, title
+
+    for author_id, first_name, last_name in Author.objects.values_list('id', 'first_name', 'last_name').iterator():
+        name = f'{first_name} {last_name}'
+        yield name, 'authors', author_id, name
+        yield f'{last_name} {first_name}', 'authors', author_id, name
+
+    for slug, name in Tag.objects.values_list('slug', 'name').iterator():
+        yield name, 'tags', slug, name
+        yield slug, 'tags', slug, name
+
+
+_lock = threading.Lock()
+_index = None
+_version = None
+_rebuilding = None
+
+
+def current_version():
+    return site_cache.versions(NAMESPACES)
+
+
+def _rebuild():
+    global _index, _version, _rebuilding
+    try:
+        # Changes made while building are picked up by another pass.
+        while True:
+            version = current_version()
+            index = PrefixIndex(catalog_entries())
+            with _lock:
+                _index, _version = index, version
+                if current_version() == version:
+                    return
+    finally:
+        with _lock:
+            _rebuilding = None
+        connection.close()
+
+
+def get_index():
+    """
+    Only the first call in a process builds the index inline. After a catalog
+    change, the current index keeps answering while a background thread
+    builds the next one.
+    """
+    global _index, _version, _rebuilding
+    version = current_version()
+    with _lock:
+        if _index is None:
+            _index, _version = PrefixIndex(catalog_entries()), version
+        elif version != _version and _rebuilding is None:
+            _rebuilding = threading.Thread(target=_rebuild, name='autocomplete-rebuild', daemon=True)
+            _rebuilding.start()
+        return _index
+
+
+def complete(prefix, limit=5):
+    results = get_index().complete(prefix, limit)
+    return {
+        'books': [
+            {'id': book_id, 'label': title, 'url': reverse('books:book_detail', args=[book_id])}
+            for book_id, title in results['books']
+        ],
+        'authors': [
+            {'id': author_id, 'label': name, 'url': reverse('books:author_detail', args=[author_id])}
+            for author_id, name in results['authors']
+        ],
+        'tags': [
+            {'id': slug, 'label': name, 'url': reverse('books:book_list_by_tag', args=[slug])}
+            for slug, name in results['tags']
+        ],
+    }
@@ -0,0 +1,71 @@
+"""
+Adding and removing bookmarks in bulk.
+
+bulk_create sends no model signals, and books.signals.bookmark_changed
+ignores queryset deletes, so the follow-up work (co-occurrence refresh,
+trending score) is scheduled here, once per call.
+"""
+from django.db.models import Exists, OuterRef
+from .models import Books, Bookmarks
+from .popularity import record_many_on_commit
+from .recommendations import mark_for_refresh
+
+MAX_BULK_BOOKMARKS = 100
+
+
+def _schedule_refresh(profile, book_ids, added=()):
+    user_id, book_ids = profile.user_id, list(book_ids)
+    if not book_ids:
+        return
+    mark_for_refresh(user_id, book_ids)
+    if added:
+        record_many_on_commit(added, 'bookmark')
+
+
+def add_bookmarks(profile, book_ids):
+    """
+    Bookmark ``book_ids`` in one INSERT. Unknown books are skipped. Returns
+    the ids that were not bookmarked before.
+    """
+    books = Books.objects.filter(pk__in=set(book_ids)).annotate(
+        bookmarked=Exists(Bookmarks.objects.filter(profile=profile, book=OuterRef('pk')))
+    ).values_list('pk', 'bookmarked')
+    added = sorted(book_id for book_id, bookmarked in books if not bookmarked)
+    # A concurrent request may have added some of them since; those are ignored.
+    Bookmarks.objects.bulk_create([Bookmarks(profile=profile, book_id=book_id) for book_id in added],
+                                  ignore_conflicts=True)
+    _schedule_refresh(profile, added, added)
+    return added
+
+
+def remove_bookmarks(profile, book_ids):
+    """
+    Remove the bookmarks on ``book_ids``: one SELECT of the bookmarked ones,
+    then, if there are any, a SELECT for the deletion's post_delete signals
+    and one DELETE. Returns how many were removed.
+    """
+    bookmarked = list(Bookmarks.objects.filter(profile=profile, book_id__in=set(book_ids)).values_list(
+        'book_id', flat=True))
+    if not bookmarked:
+        return 0
+    removed, _ = Bookmarks.objects.filter(profile=profile, book_id__in=bookmarked).delete()
+    # Only the books that were bookmarked need their related books refreshed.
+    _schedule_refresh(profile, bookmarked)
+    return removed
+
+
+def toggle_bookmark(profile, book_id):
+    """
+    Remove the bookmark if there is one, otherwise add it. This is not a
+    single statement: the remove is tried first, and only when it removed
+    nothing is the book looked up and inserted. Returns whether the book is
+    bookmarked now.
+    """
+    if remove_bookmarks(profile, [book_id]):
+        return False
+    if add_bookmarks(profile, [book_id]):
+        return True
+    # Nothing was added: the book doesn't exist, or another request just bookmarked it.
+    if not Books.objects.filter(pk=book_id).exists():
+        raise Books.DoesNotExist('No book matches the given query.')
+    return True
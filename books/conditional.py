@@ -0,0 +1,102 @@
+import hashlib
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def collection_version(queryset):
+    stats = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return stats['last_modified'], stats['count']
+
+
+def make_etag(request, *parts):
+    # The full path is part of the tag, so pages, cursors and field selections
+    # of the same collection never share one.
+    digest = hashlib.md5(usedforsecurity=False)
+    for part in (request.get_full_path(), *parts):
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return quote_etag(digest.hexdigest())
+
+
+def conditional_response(request, last_modified, version, render):
+    """
+    Answer with 304 when the client's validators still match, otherwise call
+    ``render`` and stamp the validators on its response.
+    """
+    etag = make_etag(request, last_modified, *version)
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        return response
+
+    response = render()
+    if request.method in ('GET', 'HEAD') and response.status_code == 200:
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for ``list`` and ``retrieve``, computed from
+    ``updated_at`` before anything is serialized.
+    """
+
+    def get_etag_variant(self):
+        # Anything besides the rows themselves that changes the payload.
+        return (self.request.accepted_media_type,)
+
+    def list(self, request, *args, **kwargs):
+        last_modified, count = collection_version(self.filter_queryset(self.queryset.all()))
+        return conditional_response(
+            request, last_modified, (count, *self.get_etag_variant()),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            last_modified = self.queryset.filter(**lookup).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(
+            request, last_modified, self.get_etag_variant(),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+
+class ConditionalDetailMixin:
+    """
+    Conditional GET for HTML detail pages. Only anonymous pages are shared
+    enough to be worth validating.
+    """
+    object = None
+
+    def get_etag_variant(self):
+        return ()
+
+    def get_last_modified(self):
+        # The page renders the object anyway, so its updated_at costs no extra query.
+        self.object = self.get_object()
+        return self.object.updated_at
+
+    def render_detail(self, request, *args, **kwargs):
+        if self.object is None:
+            return super().get(request, *args, **kwargs)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return self.render_detail(request, *args, **kwargs)
+        return conditional_response(
+            request, last_modified, self.get_etag_variant(),
+            lambda: self.render_detail(request, *args, **kwargs).render(),
+        )
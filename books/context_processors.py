@@ -0,0 +1,5 @@
+from . import fragments
+
+
+def fragment_cache(request):
+    return {'fragment_timeout': fragments.FRAGMENT_TIMEOUT}
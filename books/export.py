@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Value
+from django.db.models.functions import Concat
+from rest_framework.negotiation import BaseContentNegotiation
+from .models import Books, TaggedBook
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_COLUMNS = ('id', 'title', 'author_id', 'author_name', 'description', 'date', 'price', 'status', 'updated_at')
+EXPORT_FIELDS = (*EXPORT_COLUMNS, 'tags')
+EXPORT_CHUNK_SIZE = 2000
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """The export picks its own content type, whatever the client accepts."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def export_queryset(since=None):
+    books = Books.objects.filter(status=Books.Status.PUBLISHED)
+    if since is not None:
+        books = books.filter(updated_at__gte=since)
+    # Ordered by updated_at so a partner can pass the last value it saw as the next ``since``.
+    return books.annotate(
+        author_name=Concat('author__first_name', Value(' '), 'author__last_name')
+    ).order_by('updated_at', 'id').values_list(*EXPORT_COLUMNS)
+
+
+def _with_tags(rows):
+    tags = {}
+    tagged = TaggedBook.objects.filter(content_object_id__in=[row[0] for row in rows]).order_by('tag__slug')
+    for book_id, slug in tagged.values_list('content_object_id', 'tag__slug'):
+        tags.setdefault(book_id, []).append(slug)
+    return [dict(zip(EXPORT_COLUMNS, row), tags=tags.get(row[0], [])) for row in rows]
+
+
+def export_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of row dicts, one cursor chunk at a time, so memory stays at
+    a chunk however large the catalog is. Tags cost one query per chunk.
+    """
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _with_tags(chunk)
+            chunk = []
+    if chunk:
+        yield _with_tags(chunk)
+
+
+def ndjson_stream(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode()
+
+
+def csv_stream(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([*(row[column] for column in EXPORT_COLUMNS), ','.join(row['tags'])])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def export_stream(queryset, export_format):
+    chunks = export_chunks(queryset)
+    return csv_stream(chunks) if export_format == 'csv' else ndjson_stream(chunks)
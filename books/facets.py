@@ -0,0 +1,36 @@
+from django.db.models import Count, Q
+from librarysite import cache as site_cache
+
+NAMESPACES = ('books', 'tags')
+CACHE_TIMEOUT = 60 * 60
+
+
+def compute_tag_facets():
+    from taggit.models import Tag
+    from .models import Books
+
+    published = Q(books_taggedbook_items__content_object__status=Books.Status.PUBLISHED)
+    tags = Tag.objects.annotate(
+        count=Count('books_taggedbook_items', filter=published)
+    ).filter(count__gt=0).order_by('-count', 'name').values_list('id', 'slug', 'name', 'count')
+    return [
+        {'id': tag_id, 'slug': slug, 'name': name, 'count': count}
+        for tag_id, slug, name, count in tags
+    ]
+
+
+def refresh_tag_facets():
+    facets = compute_tag_facets()
+    site_cache.set(NAMESPACES, 'tag_facets', facets, CACHE_TIMEOUT)
+    return facets
+
+
+def get_tag_facets():
+    return site_cache.get_or_set(NAMESPACES, 'tag_facets', compute_tag_facets, CACHE_TIMEOUT)
+
+
+def resolve_tag(slug):
+    for facet in get_tag_facets():
+        if facet['slug'] == slug:
+            return facet
+    return None
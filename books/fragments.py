@@ -0,0 +1,3 @@
+# Fragments are keyed on the object's updated_at, so an edit only invalidates
+# that object's fragments; stale entries simply expire.
+FRAGMENT_TIMEOUT = 60 * 60 * 24
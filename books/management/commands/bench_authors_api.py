@@ -0,0 +1,58 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Max, Prefetch, Q
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from books.models import Author, Books
+from books.views import AuthorViewSet, AUTHOR_BOOKS_PREVIEW
+
+
+class Command(BaseCommand):
+    help = ('Compare sorting authors by aggregating their books per request with the stored stats and '
+            'windowed prefetch served by api/authors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def timed(self, run, repeat):
+        timings, queries = [], 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+        return statistics.median(timings), queries
+
+    def aggregated(self, page_size):
+        published = Q(books__status=Books.Status.PUBLISHED)
+        authors = Author.objects.annotate(
+            published_count=Count('books', filter=published), latest=Max('books__date', filter=published),
+        ).order_by('-published_count', 'id').prefetch_related(
+            Prefetch('books', queryset=Books.objects.filter(status=Books.Status.PUBLISHED).order_by('-date', '-id'))
+        )[:page_size]
+        for author in authors:
+            list(author.books.all()[:AUTHOR_BOOKS_PREVIEW])
+
+    def api(self, page_size):
+        view = AuthorViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory(SERVER_NAME='localhost').get(
+            '/books/api/authors/', {'sort': 'books', 'page_size': page_size}
+        )
+        JSONRenderer().render(view(request).data)
+
+    def handle(self, *args, **options):
+        page_size, repeat = options['page_size'], options['repeat']
+        self.stdout.write(f'{Author.objects.count()} authors, {Books.objects.count()} books')
+        rows = [
+            ('aggregate per request (before)', lambda: self.aggregated(page_size)),
+            ('api/authors?sort=books (after)', lambda: self.api(page_size)),
+        ]
+        self.stdout.write(f'{"query":<34}{"median ms":>12}{"queries":>10}')
+        for label, run in rows:
+            elapsed, queries = self.timed(run, repeat)
+            self.stdout.write(f'{label:<34}{elapsed:>12.2f}{queries:>10}')
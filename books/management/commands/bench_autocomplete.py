@@ -0,0 +1,56 @@
+import random
+import statistics
+import string
+import time
+from django.core.management.base import BaseCommand
+from books.autocomplete import PrefixIndex
+
+
+def random_words(rng, count):
+    return ' '.join(
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Measure autocomplete build time and lookup latency on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--authors', type=int, default=20_000)
+        parser.add_argument('--tags', type=int, default=2_000)
+        parser.add_argument('--queries', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        entries = []
+        for book_id in range(options['books']):
+            title = random_words(rng, rng.randint(1, 5))
+            entries.append((title, 'books', book_id, title))
+        for author_id in range(options['authors']):
+            first, last = random_words(rng, 1), random_words(rng, 1)
+            entries.append((f'{first} {last}', 'authors', author_id, f'{first} {last}'))
+            entries.append((f'{last} {first}', 'authors', author_id, f'{first} {last}'))
+        for tag_id in range(options['tags']):
+            name = random_words(rng, 1)
+            entries.append((name, 'tags', name, name))
+
+        started = time.perf_counter()
+        index = PrefixIndex(entries)
+        build_time = time.perf_counter() - started
+
+        prefixes = [entry[0][:rng.randint(1, 6)] for entry in rng.choices(entries, k=options['queries'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.complete(prefix, limit=5)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        self.stdout.write(f'entries: {len(index)}, build: {build_time:.2f}s')
+        self.stdout.write(
+            f'lookup ms: mean {statistics.mean(timings):.3f}, '
+            f'p50 {timings[len(timings) // 2]:.3f}, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.3f}, max {timings[-1]:.3f}'
+        )
@@ -0,0 +1,39 @@
+import statistics
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from books.models import Books
+from books.views import BookListView
+
+
+class Command(BaseCommand):
+    help = 'Compare book list render time with cold and warm card fragment caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[6, 60])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def render(self, page_size, warm):
+        view = BookListView.as_view(paginate_by=page_size)
+        request = RequestFactory(SERVER_NAME='localhost').get('/books/')
+        request.user = AnonymousUser()
+        if not warm:
+            books = Books.objects.filter(status=Books.Status.PUBLISHED).order_by('-date', '-id')
+            cache.delete_many([
+                make_template_fragment_key('book_card', [book_id, updated_at])
+                for book_id, updated_at in books.values_list('id', 'updated_at')[:page_size]
+            ])
+        started = time.perf_counter()
+        view(request).render()
+        return (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"cards":>6}{"cold ms":>12}{"warm ms":>12}{"speedup":>10}')
+        for page_size in options['page_sizes']:
+            cold = statistics.median(self.render(page_size, warm=False) for _ in range(options['repeat']))
+            self.render(page_size, warm=True)
+            warm = statistics.median(self.render(page_size, warm=True) for _ in range(options['repeat']))
+            self.stdout.write(f'{page_size:>6}{cold:>12.2f}{warm:>12.2f}{cold / warm:>9.1f}x')
@@ -0,0 +1,43 @@
+import statistics
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from books.views import BookViewSet
+
+FULL_REPRESENTATION = 'author,description,date,status,pdf_file,comments,can_view_pdf'
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and serialization time of the full and slim book list representations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, params, repeat):
+        view = BookViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        timings, size, queries = [], 0, 0
+        for _ in range(repeat):
+            request = factory.get('/books/api/books/', params)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = view(request)
+                body = JSONRenderer().render(response.data)
+                timings.append((time.perf_counter() - started) * 1000)
+            size, queries = len(body), len(captured)
+        return statistics.median(timings), size, queries
+
+    def handle(self, *args, **options):
+        page_size, repeat = options['page_size'], options['repeat']
+        rows = [
+            ('full (before)', {'page_size': page_size, 'expand': FULL_REPRESENTATION}),
+            ('slim list (after)', {'page_size': page_size}),
+        ]
+        self.stdout.write(f'{"representation":<20}{"median ms":>12}{"bytes":>12}{"queries":>10}')
+        for label, params in rows:
+            elapsed, size, queries = self.measure(params, repeat)
+            self.stdout.write(f'{label:<20}{elapsed:>12.2f}{size:>12}{queries:>10}')
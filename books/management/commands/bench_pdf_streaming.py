@@ -0,0 +1,97 @@
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from books.pdf_serving import serve_file
+
+
+def _drain(sock):
+    buffer = bytearray(256 * 1024)
+    while sock.recv_into(buffer):
+        pass
+    sock.close()
+
+
+def _python_copy(response, sock):
+    for chunk in response.streaming_content:
+        sock.sendall(chunk)
+
+
+def _sendfile(response, sock):
+    # What gunicorn's wsgi.file_wrapper does with a file that has a fileno.
+    fileno = response.file_to_stream.fileno()
+    offset = os.lseek(fileno, 0, os.SEEK_CUR)
+    remaining = int(response['Content-Length'])
+    while remaining:
+        sent = os.sendfile(sock.fileno(), fileno, offset, remaining)
+        offset += sent
+        remaining -= sent
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent large-PDF downloads per worker for each PDF serving strategy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--downloads', type=int, default=32)
+        parser.add_argument('--range-kb', type=int, default=1024,
+                            help='Size of the first range request a PDF viewer makes.')
+
+    def download(self, field_file, headers, mode, transfer):
+        request = RequestFactory().get('/books/view_pdf_file/1/', headers=headers)
+        started = time.perf_counter()
+        with override_settings(PDF_SERVE_MODE=mode):
+            response = serve_file(request, field_file)
+        if transfer is not None:
+            sender, receiver = socket.socketpair()
+            reader = threading.Thread(target=_drain, args=(receiver,))
+            reader.start()
+            transfer(response, sender)
+            sender.close()
+            reader.join()
+        response.close()
+        return (time.perf_counter() - started) * 1000, int(response.get('Content-Length') or 0)
+
+    def run_scenario(self, field_file, headers, mode, transfer, options):
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(
+                lambda _: self.download(field_file, headers, mode, transfer), range(options['downloads'])
+            ))
+        wall = time.perf_counter() - wall_started
+        cpu_ms = (time.process_time() - cpu_started) * 1000 / options['downloads']
+        sent_mb = sum(size for _, size in results) / 1024 / 1024
+        return statistics.median(ms for ms, _ in results), cpu_ms, sent_mb / wall
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'bench.pdf'), 'wb') as pdf:
+                block = os.urandom(1024 * 1024)
+                for _ in range(options['size_mb']):
+                    pdf.write(block)
+            field_file = SimpleNamespace(name='bench.pdf', storage=FileSystemStorage(location=directory))
+
+            first_range = {'Range': f'bytes=0-{options["range_kb"] * 1024 - 1}'}
+            scenarios = [
+                ('full file, python copy', {}, 'django', _python_copy),
+                ('full file, os.sendfile', {}, 'django', _sendfile),
+                ('first range, python copy', first_range, 'django', _python_copy),
+                ('first range, os.sendfile', first_range, 'django', _sendfile),
+                ('x-accel-redirect', {}, 'x-accel-redirect', None),
+            ]
+            self.stdout.write(
+                f'{options["downloads"]} downloads of a {options["size_mb"]} MB file, '
+                f'{options["concurrency"]} concurrent'
+            )
+            self.stdout.write(f'{"strategy":<28}{"median ms":>12}{"cpu ms/dl":>12}{"MB/s":>10}')
+            for label, headers, mode, transfer in scenarios:
+                median, cpu_ms, throughput = self.run_scenario(field_file, headers, mode, transfer, options)
+                self.stdout.write(f'{label:<28}{median:>12.2f}{cpu_ms:>12.2f}{throughput:>10.0f}')
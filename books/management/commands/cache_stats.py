@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from librarysite import cache as site_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counts and average latency of the site cache per cached item.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = site_cache.get_stats()
+        self.stdout.write(f'{"item":<28}{"hits":>10}{"misses":>10}{"hit %":>8}{"hit ms":>10}{"miss ms":>10}')
+        for label, counters in sorted(stats.items()):
+            hits, misses = counters['hits'], counters['misses']
+            total = hits + misses
+            hit_rate = 100 * hits / total if total else 0
+            hit_ms = counters['hit_us'] / hits / 1000 if hits else 0
+            miss_ms = counters['miss_us'] / misses / 1000 if misses else 0
+            self.stdout.write(f'{label:<28}{hits:>10}{misses:>10}{hit_rate:>7.1f}%{hit_ms:>10.3f}{miss_ms:>10.3f}')
+        if options['reset']:
+            site_cache.reset_stats()
@@ -0,0 +1,307 @@
+import csv
+import json
+import os
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import Tag
+from taggit.utils import parse_tags
+from librarysite.cache import bump_on_commit
+from books.models import Books, Author, TaggedBook
+from books.search import update_search_vectors, memory_index_enabled
+from books.stats import update_author_stats
+from books.search_index import schedule_sync
+from books.tasks import ingest_pdf, refresh_similar_books
+
+INPUT_FORMATS = ('csv', 'jsonl')
+BOOK_FIELDS = ('description', 'date', 'price', 'status')
+STATUS_ALIASES = {label.lower(): value for value, label in Books.Status.choices}
+
+
+def _lines(handle, position):
+    # Text-mode files refuse tell() while being iterated, so track the byte
+    # offset ourselves; it is where a resumed import picks up.
+    while True:
+        line = handle.readline()
+        if not line:
+            return
+        position[0] += len(line)
+        yield line.decode('utf-8')
+
+
+def read_rows(path, input_format, offset=0):
+    """
+    Yield (row, offset) pairs, where offset is the byte position just past the
+    row. CSV rows are dicts; JSONL rows are left as text for parse_row.
+    """
+    with open(path, 'rb') as handle:
+        header = None
+        if input_format == 'csv':
+            header = next(csv.reader([handle.readline().decode('utf-8-sig')]), None)
+            if header is None:
+                return
+        position = [max(offset, handle.tell())]
+        handle.seek(position[0])
+        if header is not None:
+            for values in csv.reader(_lines(handle, position)):
+                if values:
+                    yield dict(zip(header, values)), position[0]
+        else:
+            for line in _lines(handle, position):
+                if line.strip():
+                    yield line, position[0]
+
+
+def _text(row, key, model, required=True):
+    value = (row.get(key) or '').strip()
+    if required and not value:
+        raise ValueError(f'{key} is required')
+    max_length = model._meta.get_field(key.removeprefix('author_')).max_length
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def parse_row(raw):
+    row = json.loads(raw) if isinstance(raw, str) else raw
+    tags = row.get('tags') or []
+    if isinstance(tags, str):
+        tags = parse_tags(tags)
+    status = row.get('status') or Books.Status.DRAFT
+    status = STATUS_ALIASES.get(status.lower(), status)
+    if status not in Books.Status.values:
+        raise ValueError(f'unknown status {status!r}')
+    return {
+        'author': (_text(row, 'author_first_name', Author), _text(row, 'author_last_name', Author)),
+        'birth_date': date.fromisoformat(row['author_birth_date']),
+        'about': row.get('author_about') or '',
+        'title': _text(row, 'title', Books),
+        'description': row.get('description') or '',
+        'date': date.fromisoformat(row['date']),
+        'price': Decimal(str(row['price'])),
+        'status': status,
+        'tags': sorted({str(tag).strip() for tag in tags if str(tag).strip()}),
+        'pdf': row.get('pdf') or '',
+    }
+
+
+class CatalogImporter:
+    """
+    Upsert authors, books and tags a batch at a time. Authors are matched on
+    first and last name and books on author and title, so re-running a file
+    updates rows in place. Author and tag ids are remembered across batches.
+    """
+
+    def __init__(self, batch_size=1000, pdf_root=None):
+        self.batch_size = batch_size
+        self.pdf_root = pdf_root
+        self.authors = {}
+        self.tag_ids = {}
+        self.counts = dict.fromkeys(('created', 'updated', 'unchanged', 'pdfs', 'missing_pdfs'), 0)
+
+    def import_batch(self, rows):
+        # Later rows for the same book win.
+        rows = list({(row['author'], row['title']): row for row in rows}.values())
+        with transaction.atomic():
+            author_ids = self.upsert_authors(rows)
+            books, changed_ids = self.upsert_books(rows, author_ids)
+            changed_ids |= self.set_tags(rows, books)
+            pdf_ids = self.copy_pdfs(rows, books) if self.pdf_root else []
+            update_search_vectors(changed_ids)
+            update_author_stats({book.author_id for book in books.values() if book.id in changed_ids})
+
+            if memory_index_enabled():
+                transaction.on_commit(schedule_sync, robust=True)
+            for book_id in pdf_ids:
+                transaction.on_commit(lambda book_id=book_id: ingest_pdf.delay(book_id), robust=True)
+            bump_on_commit('books', 'authors', 'tags')
+
+    def upsert_authors(self, rows):
+        wanted = {row['author']: (row['birth_date'], row['about']) for row in rows}
+        unknown = [key for key in wanted if key not in self.authors]
+        if unknown:
+            existing = Author.objects.filter(
+                first_name__in={first for first, _ in unknown}, last_name__in={last for _, last in unknown}
+            ).order_by('id').values_list('id', 'first_name', 'last_name', 'birth_date', 'about')
+            for author_id, first_name, last_name, birth_date, about in existing:
+                self.authors.setdefault((first_name, last_name), (author_id, birth_date, about))
+
+        now = timezone.now()
+        created, changed = [], []
+        for (first_name, last_name), (birth_date, about) in wanted.items():
+            known = self.authors.get((first_name, last_name))
+            if known is None:
+                created.append(Author(first_name=first_name, last_name=last_name, birth_date=birth_date, about=about))
+            elif known[1:] != (birth_date, about):
+                changed.append(Author(id=known[0], birth_date=birth_date, about=about, updated_at=now))
+                self.authors[(first_name, last_name)] = (known[0], birth_date, about)
+        Author.objects.bulk_create(created, batch_size=self.batch_size)
+        Author.objects.bulk_update(changed, ['birth_date', 'about', 'updated_at'], batch_size=self.batch_size)
+        for author in created:
+            self.authors[(author.first_name, author.last_name)] = (author.id, author.birth_date, author.about)
+        return {key: self.authors[key][0] for key in wanted}
+
+    def upsert_books(self, rows, author_ids):
+        keys = {(author_ids[row['author']], row['title']): row for row in rows}
+        existing = {
+            (book.author_id, book.title): book
+            for book in Books.objects.filter(
+                author_id__in={author_id for author_id, _ in keys}, title__in={title for _, title in keys}
+            ).only('id', 'author_id', 'title', 'pdf_file', *BOOK_FIELDS).order_by('-id')
+        }
+
+        now = timezone.now()
+        books, created, changed = {}, [], []
+        for (author_id, title), row in keys.items():
+            book = existing.get((author_id, title))
+            if book is None:
+                book = Books(author_id=author_id, title=title, **{field: row[field] for field in BOOK_FIELDS})
+                created.append(book)
+            elif any(getattr(book, field) != row[field] for field in BOOK_FIELDS):
+                for field in BOOK_FIELDS:
+                    setattr(book, field, row[field])
+                book.updated_at = now
+                changed.append(book)
+            books[(row['author'], title)] = book
+        Books.objects.bulk_create(created, batch_size=self.batch_size)
+        Books.objects.bulk_update(changed, [*BOOK_FIELDS, 'updated_at'], batch_size=self.batch_size)
+
+        self.counts['created'] += len(created)
+        self.counts['updated'] += len(changed)
+        self.counts['unchanged'] += len(keys) - len(created) - len(changed)
+        return books, {book.id for book in created + changed}
+
+    def resolve_tags(self, names):
+        unknown = [name for name in names if name not in self.tag_ids]
+        if not unknown:
+            return
+        self.tag_ids.update(Tag.objects.filter(name__in=unknown).values_list('name', 'id'))
+        missing = [name for name in unknown if name not in self.tag_ids]
+        Tag.objects.bulk_create([Tag(name=name, slug=Tag().slugify(name)) for name in missing],
+                                ignore_conflicts=True)
+        self.tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+        for name in missing:
+            # Names that slugify to an existing slug; Tag.save() picks a free one.
+            if name not in self.tag_ids:
+                self.tag_ids[name] = Tag.objects.get_or_create(name=name)[0].id
+
+    def set_tags(self, rows, books):
+        """Make each book's tags match its row. Returns ids of existing books whose tags changed."""
+        self.resolve_tags({name for row in rows for name in row['tags']})
+        wanted = {
+            books[(row['author'], row['title'])].id: {self.tag_ids[name] for name in row['tags']} for row in rows
+        }
+        current = {}
+        for book_id, tag_id in TaggedBook.objects.filter(content_object_id__in=wanted).values_list(
+                'content_object_id', 'tag_id'):
+            current.setdefault(book_id, set()).add(tag_id)
+
+        added, touched = [], set()
+        for book_id, tag_ids in wanted.items():
+            had = current.get(book_id, set())
+            added.extend(TaggedBook(content_object_id=book_id, tag_id=tag_id) for tag_id in tag_ids - had)
+            if had - tag_ids:
+                TaggedBook.objects.filter(content_object_id=book_id, tag_id__in=had - tag_ids).delete()
+            if had and had != tag_ids:
+                touched.add(book_id)
+        TaggedBook.objects.bulk_create(added, batch_size=self.batch_size, ignore_conflicts=True)
+        Books.objects.filter(pk__in=touched).update(updated_at=timezone.now())
+        return touched
+
+    def copy_pdfs(self, rows, books):
+        # Books that already have a PDF keep it; replacing one goes through the admin.
+        copied = []
+        for row in rows:
+            book = books[(row['author'], row['title'])]
+            if not row['pdf'] or book.pdf_file:
+                continue
+            source = os.path.join(self.pdf_root, row['pdf'])
+            if not os.path.isfile(source):
+                self.counts['missing_pdfs'] += 1
+                continue
+            with open(source, 'rb') as pdf:
+                book.pdf_file.save(os.path.basename(source), File(pdf), save=False)
+            Books.objects.filter(pk=book.id).update(pdf_file=book.pdf_file.name)
+            copied.append(book.id)
+        self.counts['pdfs'] += len(copied)
+        return copied
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL catalog of books, authors and tags into the database, resumably.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input-format', choices=INPUT_FORMATS,
+                            help='Defaults to the file extension (.csv, otherwise JSONL).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pdf-root', help='Directory that the "pdf" column is relative to; enables PDF copying.')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+
+    def load_checkpoint(self, checkpoint, source):
+        try:
+            with open(checkpoint) as handle:
+                state = json.load(handle)
+        except (OSError, ValueError):
+            return 0, 0
+        if state.get('source') != source or state.get('size', 0) > os.path.getsize(source):
+            return 0, 0
+        return state['offset'], state['rows']
+
+    def save_checkpoint(self, checkpoint, source, offset, rows):
+        with open(checkpoint + '.tmp', 'w') as handle:
+            json.dump({'source': source, 'size': os.path.getsize(source), 'offset': offset, 'rows': rows}, handle)
+        os.replace(checkpoint + '.tmp', checkpoint)
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['path'])
+        if not os.path.isfile(source):
+            raise CommandError(f'{source} does not exist.')
+        input_format = options['input_format'] or ('csv' if source.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or source + '.checkpoint'
+        offset, done = (0, 0) if options['restart'] else self.load_checkpoint(checkpoint, source)
+        if offset:
+            self.stdout.write(f'Resuming after row {done}.')
+
+        importer = CatalogImporter(options['batch_size'], options['pdf_root'])
+        batch, invalid, imported = [], 0, 0
+        started = time.perf_counter()
+
+        def flush(position):
+            nonlocal imported
+            importer.import_batch(batch)
+            imported += len(batch)
+            self.save_checkpoint(checkpoint, source, position, done)
+            batch.clear()
+            self.stdout.write(f'{done} rows, {imported / (time.perf_counter() - started):.0f} rows/s')
+
+        position = offset
+        for raw, position in read_rows(source, input_format, offset):
+            done += 1
+            try:
+                batch.append(parse_row(raw))
+            except (AttributeError, KeyError, TypeError, ValueError, InvalidOperation) as exc:
+                invalid += 1
+                self.stderr.write(f'Row {done}: {exc!r}')
+            if len(batch) >= options['batch_size']:
+                flush(position)
+        if batch:
+            flush(position)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        if imported:
+            # New vocabulary from the import only enters the index on a full rebuild.
+            transaction.on_commit(lambda: refresh_similar_books.delay(), robust=True)
+
+        elapsed = time.perf_counter() - started
+        counts = importer.counts
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} rows in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/s): '
+            f'{counts["created"]} created, {counts["updated"]} updated, {counts["unchanged"]} unchanged, '
+            f'{invalid} invalid, {counts["pdfs"]} PDFs copied, {counts["missing_pdfs"]} PDFs missing.'
+        ))
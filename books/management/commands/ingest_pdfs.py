@@ -0,0 +1,47 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F, Q
+from books.models import Books, BookPdfInfo
+from books.pdf_ingest import ingest_book_pdf
+
+
+def _init_worker():
+    django.setup()
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Extract page counts, page text and thumbnails for book PDFs, in parallel worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=4)
+        parser.add_argument('--all', action='store_true', help='Reprocess PDFs that are already up to date.')
+
+    def handle(self, *args, **options):
+        books = Books.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True)
+        if not options['all']:
+            books = books.exclude(
+                Q(pdf_info__status=BookPdfInfo.Status.DONE) & Q(pdf_info__source_name=F('pdf_file'))
+            )
+        book_ids = list(books.order_by('id').values_list('id', flat=True))
+        if not book_ids:
+            self.stdout.write('All book PDFs are up to date.')
+            return
+
+        connections.close_all()
+        statuses = Counter()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            for done, status in enumerate(pool.map(ingest_book_pdf, book_ids, chunksize=options['chunk_size']), 1):
+                statuses[status] += 1
+                if done % 100 == 0:
+                    self.stdout.write(f'{done}/{len(book_ids)}')
+
+        labels = dict(BookPdfInfo.Status.choices)
+        summary = ', '.join(f'{labels.get(status, "skipped")}: {count}' for status, count in statuses.items())
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(book_ids)} PDFs ({summary}).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from librarysite import throttling
+
+
+class Command(BaseCommand):
+    help = 'Show how many requests each throttle scope and identity kind has rejected.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing them.')
+
+    def handle(self, *args, **options):
+        rejections = throttling.get_rejections()
+        self.stdout.write(f'{"scope:identity":<32}{"rejected":>10}')
+        for label, count in sorted(rejections.items()):
+            self.stdout.write(f'{label:<32}{count:>10}')
+        if options['reset']:
+            throttling.reset_rejections()
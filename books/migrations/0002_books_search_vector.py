@@ -0,0 +1,81 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import TextField, Value
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='books_search_vector_idx'),
+    django.contrib.postgres.indexes.GinIndex(fields=['title'], name='books_title_trgm_idx',
+                                             opclasses=['gin_trgm_ops']),
+]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Books = apps.get_model('books', 'Books')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Books, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Books = apps.get_model('books', 'Books')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Books, index)
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Books = apps.get_model('books', 'Books')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+
+    content_type = ContentType.objects.filter(app_label='books', model='books').first()
+    tag_names = {}
+    if content_type:
+        for object_id, name in TaggedItem.objects.filter(content_type=content_type).values_list('object_id',
+                                                                                                 'tag__name'):
+            tag_names.setdefault(object_id, []).append(name)
+
+    for book in Books.objects.select_related('author').iterator():
+        parts = [
+            (book.title, 'A'),
+            (f'{book.author.first_name} {book.author.last_name}', 'B'),
+            (' '.join(tag_names.get(book.id, [])), 'B'),
+            (book.description, 'C'),
+        ]
+        vector = None
+        for text, weight in parts:
+            part = SearchVector(Value(text or '', output_field=TextField()), weight=weight, config='english')
+            vector = part if vector is None else vector + part
+        Books.objects.filter(pk=book.pk).update(search_vector=vector)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='books',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='books', index=index) for index in SEARCH_INDEXES],
+            database_operations=[migrations.RunPython(add_search_indexes, remove_search_indexes)],
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
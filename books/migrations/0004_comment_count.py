@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_comment_counts(apps, schema_editor):
+    Books = apps.get_model('books', 'Books')
+    Comments = apps.get_model('books', 'Comments')
+    counts = Comments.objects.filter(books=OuterRef('pk')).order_by().values('books').annotate(
+        total=Count('id')
+    ).values('total')
+    Books.objects.update(comment_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_remove_profile_purchased_books'),
+        ('books', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='books',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(fields=['books', '-created_at', '-id'], name='comments_book_created_id_idx'),
+        ),
+        migrations.RunPython(populate_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:40
+
+import django.db.models.deletion
+import taggit.managers
+from django.db import migrations, models
+
+
+def copy_book_tags(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TaggedBook = apps.get_model('books', 'TaggedBook')
+    content_type = ContentType.objects.filter(app_label='books', model='books').first()
+    if content_type is None:
+        return
+    items = TaggedItem.objects.filter(content_type=content_type)
+    TaggedBook.objects.bulk_create(
+        (TaggedBook(tag_id=tag_id, content_object_id=book_id)
+         for tag_id, book_id in items.values_list('tag_id', 'object_id').iterator()),
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+    items.delete()
+
+
+def restore_book_tags(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TaggedBook = apps.get_model('books', 'TaggedBook')
+    content_type, _ = ContentType.objects.get_or_create(app_label='books', model='books')
+    TaggedItem.objects.bulk_create(
+        (TaggedItem(tag_id=tag_id, object_id=book_id, content_type=content_type)
+         for tag_id, book_id in TaggedBook.objects.values_list('tag_id', 'content_object_id').iterator()),
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_comment_count'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaggedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tagged_items', to='books.books')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(app_label)s_%(class)s_items', to='taggit.tag')),
+            ],
+            options={
+                'verbose_name': 'Tagged book',
+                'verbose_name_plural': 'Tagged books',
+            },
+        ),
+        migrations.AlterField(
+            model_name='books',
+            name='tags',
+            field=taggit.managers.TaggableManager(help_text='A comma-separated list of tags.', through='books.TaggedBook', to='taggit.Tag', verbose_name='Tags'),
+        ),
+        migrations.AddConstraint(
+            model_name='taggedbook',
+            constraint=models.UniqueConstraint(fields=('tag', 'content_object'), name='tagged_book_tag_book_uniq'),
+        ),
+        migrations.RunPython(copy_book_tags, restore_book_tags),
+    ]
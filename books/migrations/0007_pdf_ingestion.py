@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+PAGE_SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['search_vector'],
+                                                             name='book_page_search_vector_idx')
+
+
+def add_page_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('books', 'BookPage'), PAGE_SEARCH_INDEX)
+
+
+def remove_page_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('books', 'BookPage'), PAGE_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPdfInfo',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pdf_info', serialize=False, to='books.books')),
+                ('source_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('PN', 'Pending'), ('DN', 'Done'), ('FL', 'Failed')], default='PN', max_length=2)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('thumbnail', models.ImageField(blank=True, null=True, upload_to='books/thumbnails/')),
+                ('error', models.TextField(blank=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Book PDF info',
+                'verbose_name_plural': 'Book PDF info',
+            },
+        ),
+        migrations.CreateModel(
+            name='BookPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='books.books')),
+            ],
+            options={
+                'ordering': ['book', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('book', 'number'), name='book_page_number_uniq')],
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='bookpage', index=PAGE_SEARCH_INDEX)],
+            database_operations=[migrations.RunPython(add_page_search_index, remove_page_search_index)],
+        ),
+    ]
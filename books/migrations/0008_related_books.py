@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_pdf_ingestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CO', 'Readers also bookmarked or bought')], max_length=2)),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related', to='books.books')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.books')),
+            ],
+            options={
+                'verbose_name': 'Related book',
+                'verbose_name_plural': 'Related books',
+                'indexes': [models.Index(fields=['book', 'kind', '-score'], name='related_book_kind_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'kind', 'related'), name='related_book_uniq')],
+            },
+        ),
+    ]
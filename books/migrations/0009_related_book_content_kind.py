@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_related_books'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatedbook',
+            name='kind',
+            field=models.CharField(choices=[('CO', 'Readers also bookmarked or bought'), ('CT', 'Similar books')], max_length=2),
+        ),
+    ]
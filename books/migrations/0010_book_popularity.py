@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_related_book_content_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPopularity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='books.books')),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Book popularity',
+                'verbose_name_plural': 'Book popularity',
+                'indexes': [models.Index(fields=['-score'], name='book_popularity_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:18
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_author_stats(apps, schema_editor):
+    Author = apps.get_model('books', 'Author')
+    Books = apps.get_model('books', 'Books')
+    published = Books.objects.filter(author=OuterRef('pk'), status='PB').order_by().values('author')
+    Author.objects.update(
+        book_count=Coalesce(Subquery(published.annotate(total=Count('id')).values('total'),
+                                     output_field=IntegerField()), 0),
+        last_published=Subquery(published.annotate(last=Max('date')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='last_published',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['-book_count', 'id'], name='author_book_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['-last_published', 'id'], name='author_last_published_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='books',
+            index=models.Index(fields=['author', 'status', '-date', '-id'], name='books_author_status_date_idx'),
+        ),
+        migrations.RunPython(populate_author_stats, migrations.RunPython.noop),
+    ]
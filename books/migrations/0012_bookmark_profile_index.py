@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_remove_profile_purchased_books'),
+        ('books', '0011_author_book_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmarks',
+            index=models.Index(fields=['profile', '-date_added', '-id'], name='bookmark_profile_added_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_bookmark_profile_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRelatedRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('book_id', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Pending related books refresh',
+                'verbose_name_plural': 'Pending related books refreshes',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_pending_related_refresh'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingrelatedrefresh',
+            name='kind',
+            field=models.CharField(choices=[('CO', 'Readers also bookmarked or bought'), ('CT', 'Similar books')], default='CO', max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='pendingrelatedrefresh',
+            name='user_id',
+            field=models.IntegerField(null=True),
+        ),
+    ]
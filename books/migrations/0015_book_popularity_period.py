@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_pending_content_refresh'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookpopularity',
+            name='period',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_book_popularity_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Search index tombstone',
+                'verbose_name_plural': 'Search index tombstones',
+            },
+        ),
+    ]
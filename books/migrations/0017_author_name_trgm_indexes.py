@@ -0,0 +1,39 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+NAME_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='author_first_name_trgm_idx',
+                                             opclasses=['gin_trgm_ops']),
+    django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='author_last_name_trgm_idx',
+                                             opclasses=['gin_trgm_ops']),
+]
+
+
+def add_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Author = apps.get_model('books', 'Author')
+    for index in NAME_INDEXES:
+        schema_editor.add_index(Author, index)
+
+
+def remove_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Author = apps.get_model('books', 'Author')
+    for index in NAME_INDEXES:
+        schema_editor.remove_index(Author, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_search_index_tombstone'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='author', index=index) for index in NAME_INDEXES],
+            database_operations=[migrations.RunPython(add_name_indexes, remove_name_indexes)],
+        ),
+    ]
@@ -1,7 +1,10 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 from django.urls import reverse
 from taggit.managers import TaggableManager
+from taggit.models import TaggedItemBase
 from accounts.models import Profile, MyUser
 
 
@@ -15,9 +18,12 @@ class Books(models.Model):
     description = models.TextField()
     date = models.DateField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    tags = TaggableManager()
+    tags = TaggableManager(through='TaggedBook')
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.DRAFT)
     pdf_file = models.FileField(upload_to='books/pdfs/', blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -28,6 +34,25 @@ class Books(models.Model):
     class Meta:
         verbose_name = 'Book'
         verbose_name_plural = 'Books'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='books_search_vector_idx'),
+            GinIndex(fields=['title'], name='books_title_trgm_idx', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['-date', '-id'], name='books_date_id_idx'),
+            models.Index(fields=['status', '-date', '-id'], name='books_status_date_id_idx'),
+            models.Index(fields=['author', 'status', '-date', '-id'], name='books_author_status_date_idx'),
+            models.Index(fields=['updated_at'], name='books_updated_at_idx'),
+        ]
+
+
+class TaggedBook(TaggedItemBase):
+    content_object = models.ForeignKey(Books, on_delete=models.CASCADE, related_name='tagged_items')
+
+    class Meta:
+        verbose_name = 'Tagged book'
+        verbose_name_plural = 'Tagged books'
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'content_object'], name='tagged_book_tag_book_uniq'),
+        ]
 
 
 class Comments(models.Model):
@@ -39,6 +64,9 @@ class Comments(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['books', '-created_at', '-id'], name='comments_book_created_id_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.profile.user.username}'
@@ -48,11 +76,134 @@ class Comments(models.Model):
         return self.created_at != self.updated_at
 
 
+class BookPdfInfo(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PN', 'Pending'
+        DONE = 'DN', 'Done'
+        FAILED = 'FL', 'Failed'
+
+    book = models.OneToOneField(Books, on_delete=models.CASCADE, primary_key=True, related_name='pdf_info')
+    source_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=2, choices=Status.choices, default=Status.PENDING)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.ImageField(upload_to='books/thumbnails/', blank=True, null=True)
+    error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Book PDF info'
+        verbose_name_plural = 'Book PDF info'
+
+    def __str__(self):
+        return f'PDF info for book {self.book_id}'
+
+
+class BookPage(models.Model):
+    book = models.ForeignKey(Books, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        ordering = ['book', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'number'], name='book_page_number_uniq'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='book_page_search_vector_idx'),
+        ]
+
+    def __str__(self):
+        return f'Page {self.number} of book {self.book_id}'
+
+
+class BookPopularity(models.Model):
+    """
+    Exponentially decayed activity score, kept scaled to the start of a
+    books.popularity period so that adding to it never requires rescoring
+    other books.
+    """
+    book = models.OneToOneField(Books, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    score = models.FloatField(default=0)
+    # The books.popularity period the score is scaled to.
+    period = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Book popularity'
+        verbose_name_plural = 'Book popularity'
+        indexes = [
+            models.Index(fields=['-score'], name='book_popularity_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'Popularity of book {self.book_id}'
+
+
+class RelatedBook(models.Model):
+    """Precomputed top-K neighbours of a book, rebuilt offline by books.recommendations."""
+
+    class Kind(models.TextChoices):
+        COOCCURRENCE = 'CO', 'Readers also bookmarked or bought'
+        CONTENT = 'CT', 'Similar books'
+
+    book = models.ForeignKey(Books, on_delete=models.CASCADE, related_name='related')
+    related = models.ForeignKey(Books, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=2, choices=Kind.choices)
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name = 'Related book'
+        verbose_name_plural = 'Related books'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'kind', 'related'], name='related_book_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'kind', '-score'], name='related_book_kind_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.related_id} related to {self.book_id} ({self.kind})'
+
+
+class PendingRelatedRefresh(models.Model):
+    """
+    A change not yet applied to related books: a reader's bookmark or
+    purchase (co-occurrence) or a book's content (user_id is None).
+    books.recommendations.refresh_pending applies them in batches.
+    """
+    kind = models.CharField(max_length=2, choices=RelatedBook.Kind.choices, default=RelatedBook.Kind.COOCCURRENCE)
+    user_id = models.IntegerField(null=True)
+    book_id = models.IntegerField()
+
+    class Meta:
+        verbose_name = 'Pending related books refresh'
+        verbose_name_plural = 'Pending related books refreshes'
+
+    def __str__(self):
+        return f'Refresh of book {self.book_id} ({self.kind})'
+
+
+class SearchIndexTombstone(models.Model):
+    """A deleted book still to be dropped from the memory search index by books.search_index.sync_index."""
+    book_id = models.IntegerField()
+
+    class Meta:
+        verbose_name = 'Search index tombstone'
+        verbose_name_plural = 'Search index tombstones'
+
+    def __str__(self):
+        return f'Deleted book {self.book_id}'
+
+
 class Author(models.Model):
     first_name = models.CharField(max_length=15)
     last_name = models.CharField(max_length=15)
     birth_date = models.DateField()
     about = models.TextField()
+    # Published books only; kept up to date by books.stats.update_author_stats.
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    last_published = models.DateField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -63,6 +214,15 @@ class Author(models.Model):
     class Meta:
         verbose_name = 'Author'
         verbose_name_plural = 'Authors'
+        indexes = [
+            models.Index(fields=['last_name', 'id'], name='author_last_name_id_idx'),
+            # books.search.search_authors matches names by trigram similarity and icontains.
+            GinIndex(fields=['first_name'], name='author_first_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['last_name'], name='author_last_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['updated_at'], name='author_updated_at_idx'),
+            models.Index(fields=['-book_count', 'id'], name='author_book_count_id_idx'),
+            models.Index(fields=['-last_published', 'id'], name='author_last_published_id_idx'),
+        ]
 
 
 class Bookmarks(models.Model):
@@ -72,3 +232,6 @@ class Bookmarks(models.Model):
 
     class Meta:
         unique_together = ['profile', 'book']
+        indexes = [
+            models.Index(fields=['profile', '-date_added', '-id'], name='bookmark_profile_added_idx'),
+        ]
@@ -0,0 +1,236 @@
+import base64
+import datetime
+import decimal
+import json
+from collections.abc import Sequence
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# ?sort= values of the author list and API; each ordering has an index.
+AUTHOR_ORDERINGS = {
+    'name': ('last_name', 'id'),
+    'books': ('-book_count', 'id'),
+    'recent': ('-last_published', 'id'),
+}
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _field_name(ordering_field):
+    return ordering_field.lstrip('-')
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over a unique ordering such as ('-date', '-id'): each page
+    filters on the boundary row's values instead of using OFFSET.
+    """
+
+    def __init__(self, ordering, page_size):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+
+    def encode_cursor(self, obj, reverse=False):
+        position = [_json_value(getattr(obj, _field_name(field))) for field in self.ordering]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        """
+        Return (position, reverse), with each position value converted by the
+        ordering field of ``model``, or raise InvalidCursor.
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            position, reverse = data['p'], bool(data['r'])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise InvalidCursor('Invalid cursor.')
+        # Orderings never include NULLs (views filter them out), so None is never a valid boundary.
+        if (not isinstance(position, list) or len(position) != len(self.ordering)
+                or any(value is None or isinstance(value, (list, dict)) for value in position)):
+            raise InvalidCursor('Invalid cursor.')
+        try:
+            position = [
+                model._meta.get_field(_field_name(field)).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor('Invalid cursor.')
+        return position, reverse
+
+    def _seek(self, position, ordering):
+        # (a < x) OR (a = x AND b < y) ... is exact but gives the planner no range to start the index scan
+        # at; the redundant leading a <= x does, so deep pages don't walk the index from the top.
+        first = ordering[0]
+        bound = Q(**{f'{_field_name(first)}__{"lte" if first.startswith("-") else "gte"}': position[0]})
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{_field_name(field)}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position[:index]):
+                term &= Q(**{_field_name(previous): value})
+            condition |= term
+        return bound & condition if len(ordering) > 1 else condition
+
+    def paginate(self, queryset, cursor=None):
+        position, reverse = self.decode_cursor(cursor, queryset.model) if cursor else (None, False)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], reverse=True) if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetCursorPagination(BasePagination):
+    ordering = ('-id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request):
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(self.get_ordering(request), self.get_page_size(request))
+        try:
+            self.page = paginator.paginate(queryset, request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as exc:
+            raise NotFound(str(exc))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class BookCursorPagination(KeysetCursorPagination):
+    ordering = ('-date', '-id')
+
+
+class AuthorCursorPagination(KeysetCursorPagination):
+    ordering = AUTHOR_ORDERINGS['name']
+
+    def get_ordering(self, request):
+        return AUTHOR_ORDERINGS.get(request.query_params.get('sort'), self.ordering)
+
+
+class CommentCursorPagination(KeysetCursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 10
+
+
+class BookmarkCursorPagination(KeysetCursorPagination):
+    ordering = ('-date_added', '-id')
+
+
+class KeysetPaginationMixin:
+    keyset_ordering = ('-id',)
+    cursor_query_param = 'cursor'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(self.get_keyset_ordering(), page_size)
+        try:
+            page = paginator.paginate(queryset, self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,72 @@
+import pymupdf
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from .models import Books, BookPage, BookPdfInfo
+from .search import update_page_search_vectors
+
+THUMBNAIL_WIDTH = 300
+
+
+def open_document(field_file):
+    try:
+        return pymupdf.open(field_file.storage.path(field_file.name))
+    except NotImplementedError:
+        with field_file.storage.open(field_file.name, 'rb') as pdf:
+            return pymupdf.open(stream=pdf.read(), filetype='pdf')
+
+
+def extract_pdf(field_file):
+    """
+    Return the text of every page and a PNG of the first page (or None for
+    an empty document).
+    """
+    with open_document(field_file) as document:
+        texts = [page.get_text().replace('\x00', '') for page in document]
+        thumbnail = None
+        if document.page_count:
+            first_page = document[0]
+            zoom = THUMBNAIL_WIDTH / first_page.rect.width
+            thumbnail = first_page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).tobytes('png')
+    return texts, thumbnail
+
+
+def ingest_book_pdf(book_id):
+    """
+    Derive page count, per-page text and a thumbnail from a book's PDF.
+    Safe to run repeatedly; returns the resulting status, or None when the
+    book has no PDF.
+    """
+    book = Books.objects.only('id', 'pdf_file').filter(pk=book_id).first()
+    if book is None or not book.pdf_file:
+        BookPage.objects.filter(book_id=book_id).delete()
+        BookPdfInfo.objects.filter(book_id=book_id).delete()
+        return None
+
+    info, _ = BookPdfInfo.objects.get_or_create(book_id=book_id, defaults={'source_name': book.pdf_file.name})
+    info.source_name = book.pdf_file.name
+    info.processed_at = timezone.now()
+    try:
+        texts, thumbnail = extract_pdf(book.pdf_file)
+    except (pymupdf.FileDataError, RuntimeError, ValueError, OSError) as exc:
+        info.status, info.error = BookPdfInfo.Status.FAILED, str(exc)
+        info.save()
+        return info.status
+
+    with transaction.atomic():
+        BookPage.objects.filter(book_id=book_id).delete()
+        BookPage.objects.bulk_create(
+            [BookPage(book_id=book_id, number=number, text=text) for number, text in enumerate(texts, 1)],
+            batch_size=500,
+        )
+        update_page_search_vectors(book_id)
+
+        if info.thumbnail:
+            info.thumbnail.delete(save=False)
+        if thumbnail is not None:
+            info.thumbnail.save(f'{book_id}.png', ContentFile(thumbnail), save=False)
+        info.status, info.error, info.page_count = BookPdfInfo.Status.DONE, '', len(texts)
+        info.save()
+        # Fragments of this book are keyed on updated_at; catalog-wide caches don't use PDF results.
+        Books.objects.filter(pk=book_id).update(updated_at=timezone.now())
+    return info.status
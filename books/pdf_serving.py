@@ -0,0 +1,183 @@
+import os
+import re
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+SERVE_MODES = ('django', 'x-accel-redirect', 'x-sendfile')
+TOKEN_SALT = 'books.pdf'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class InvalidPdfToken(Exception):
+    pass
+
+
+def sign_pdf_path(user_id, book_id, file_name, max_age=None):
+    """
+    Return (path, expires_at) for a URL that serves ``file_name`` without
+    looking anything up: the user, book, file and expiry are all in the
+    HMAC-signed token.
+    """
+    expires_at = int(time.time()) + (settings.PDF_URL_MAX_AGE if max_age is None else max_age)
+    token = signing.dumps({'u': user_id, 'b': book_id, 'f': file_name, 'e': expires_at},
+                          salt=TOKEN_SALT, compress=True)
+    return reverse('books:signed_pdf', args=[token]), expires_at
+
+
+def verify_pdf_token(token):
+    # signing.loads compares signatures in constant time.
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidPdfToken('Invalid signature.')
+    if payload['e'] < time.time():
+        raise InvalidPdfToken('Link expired.')
+    return payload
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive (start, end) of a single ``bytes=`` range, or None
+    when the whole file should be sent. Multiple ranges are answered with the
+    whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class RangeFileWrapper:
+    """
+    Expose ``length`` bytes of a file from ``start`` on. The wrapper keeps
+    ``fileno`` and ``tell`` so WSGI servers whose ``wsgi.file_wrapper`` uses
+    ``os.sendfile`` (gunicorn) hand the range to the kernel: they send
+    Content-Length bytes from the file's current offset. Other servers fall
+    back to reading blocks, capped at the end of the range.
+    """
+
+    def __init__(self, filelike, start, length):
+        self.filelike = filelike
+        self.remaining = length
+        filelike.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.filelike.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def tell(self):
+        return self.filelike.tell()
+
+    def seekable(self):
+        return False
+
+    def fileno(self):
+        return self.filelike.fileno()
+
+    def close(self):
+        self.filelike.close()
+
+
+def _local_path(field_file):
+    try:
+        return field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return None
+
+
+def _offload_response(field_file, content_type, mode):
+    """The header-only response for the front proxy, or None when it can't reach the file."""
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.PDF_X_ACCEL_PREFIX.rstrip('/') + '/' + quote(field_file.name)
+    else:
+        path = _local_path(field_file)
+        if path is None:
+            # Storage without a filesystem path (S3 and the like); Django streams the file instead.
+            return None
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_file(request, field_file, content_type='application/pdf', filename=None):
+    """
+    Send a stored file with Range/206 support. Callers check access first;
+    in the offload modes the front proxy then sends the bytes (and handles
+    Range itself).
+    """
+    filename = filename or os.path.basename(field_file.name)
+    mode = settings.PDF_SERVE_MODE
+    response = _offload_response(field_file, content_type, mode) if mode != 'django' else None
+    if response is not None:
+        response['Content-Disposition'] = content_disposition_header(False, filename)
+        return response
+
+    path = _local_path(field_file)
+    try:
+        if path is not None:
+            filelike = open(path, 'rb')
+            stat = os.fstat(filelike.fileno())
+            size, modified = stat.st_size, stat.st_mtime
+            etag = quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+        else:
+            filelike = field_file.storage.open(field_file.name, 'rb')
+            size, modified, etag = field_file.storage.size(field_file.name), None, None
+    except FileNotFoundError:
+        # The row still names a file that is gone from storage.
+        raise Http404('PDF file not found')
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, modified and http_date(modified)):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        filelike.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    response = FileResponse(RangeFileWrapper(filelike, start, length), content_type=content_type,
+                            status=206 if byte_range else 200)
+    response.block_size = STREAM_BLOCK_SIZE
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    response['Cache-Control'] = 'private'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if etag:
+        response['ETag'] = etag
+    if modified:
+        response['Last-Modified'] = http_date(modified)
+    return response
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from subscriptions.models import BookPurchase, Subscription
+from subscriptions.entitlements import get_entitlements
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -19,13 +19,4 @@ class IsSubscribedOrPurchased(permissions.BasePermission):
         return True
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-
-        try:
-            subscription = user.subscription
-            if subscription.is_active:
-                return True
-        except Subscription.DoesNotExist:
-            pass
-
-        return BookPurchase.objects.filter(user=user, book=obj).exists()
+        return get_entitlements(request.user).can_view(obj.id)
@@ -0,0 +1,203 @@
+"""
+Trending books.
+
+Bookmarks, purchases, comments and page views add weight to a book's score,
+and scores decay with a half-life of HALF_LIFE. Rather than decaying every
+row as time passes, weight added at time t is stored multiplied by
+2 ** ((t - start) / HALF_LIFE), where start is the beginning of the current
+period of PERIOD_HALF_LIVES half-lives after EPOCH. All stored scores of a
+period share one scale: ordering by the stored value is ordering by the
+decayed score, and the current score is the stored one divided by the scale
+of now. When a period ends, compact() rebases rows to the next one (divided
+by 2 ** PERIOD_HALF_LIVES), so the scale never grows anywhere near overflow;
+reads scale rows it hasn't reached yet by their period instead of writing.
+
+Page views are too frequent for a write each. They are counted in the shared
+cache and drained into the scores by compact().
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest, Power
+from django.utils import timezone
+from librarysite import cache as site_cache
+from .models import Books, BookPopularity
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE = timedelta(days=7)
+PERIOD_HALF_LIVES = 52
+WEIGHTS = {'view': 1, 'bookmark': 3, 'comment': 4, 'purchase': 8}
+TRENDING_SIZE = 50
+CACHE_TIMEOUT = 5 * 60
+# Compaction drops books whose decayed score fell below this.
+MIN_SCORE = 0.05
+
+# Each viewed book has a view counter. The first view since the last drain
+# also writes the book id into the next numbered slot, so a drain only reads
+# the counters of books that were viewed. A pending flag, which expires in
+# case its slot was lost, marks books that already have a slot.
+VIEW_COUNT_KEY = 'popularity:views:{}'
+VIEW_PENDING_KEY = 'popularity:views:pending:{}'
+VIEW_SLOT_KEY = 'popularity:views:slot:{}'
+VIEW_SEQ_KEY = 'popularity:views:seq'
+VIEW_DRAINED_KEY = 'popularity:views:drained'
+VIEW_DRAIN_LOCK_KEY = 'popularity:views:draining'
+VIEW_PENDING_TIMEOUT = 60 * 60
+VIEW_SLOT_TIMEOUT = 24 * 60 * 60
+
+
+def _half_lives(when=None):
+    return ((when or timezone.now()) - EPOCH) / HALF_LIFE
+
+
+def current_period(when=None):
+    return int(_half_lives(when) // PERIOD_HALF_LIVES)
+
+
+def scale(when=None):
+    """The scale of ``when`` (default: now) within its period."""
+    half_lives = _half_lives(when)
+    return 2 ** (half_lives - current_period(when) * PERIOD_HALF_LIVES)
+
+
+def _period_factor(periods):
+    """2 ** (periods * PERIOD_HALF_LIVES), as a database expression."""
+    return Power(Value(2.0), periods * PERIOD_HALF_LIVES)
+
+
+def add_scores(amounts, period):
+    """
+    Add amounts, {book_id: amount}, scaled to the start of ``period``, in
+    one UPDATE. Rows still in an earlier period are rebased on the way.
+    """
+    amounts = {book_id: amount for book_id, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    # The book may have been deleted since the event was recorded.
+    existing = set(Books.objects.filter(pk__in=amounts).values_list('pk', flat=True))
+    if not existing:
+        return
+    BookPopularity.objects.bulk_create([BookPopularity(book_id=book_id, period=period) for book_id in existing],
+                                       ignore_conflicts=True)
+    amount = Case(*[When(pk=book_id, then=Value(amounts[book_id])) for book_id in existing],
+                  output_field=FloatField())
+    BookPopularity.objects.filter(pk__in=existing).update(
+        score=Case(
+            # Another process already moved the row to a later period.
+            When(period__gt=period, then=F('score') + amount * _period_factor(Value(period) - F('period'))),
+            default=F('score') * _period_factor(F('period') - Value(period)) + amount,
+        ),
+        period=Greatest('period', Value(period)),
+    )
+
+
+def rebase(period=None):
+    """Move rows of earlier periods to ``period`` (default: now's). Returns the number of rows moved."""
+    period = current_period() if period is None else period
+    return BookPopularity.objects.filter(period__lt=period).update(
+        score=F('score') * _period_factor(F('period') - Value(period)), period=period,
+    )
+
+
+def record(book_id, event):
+    now = timezone.now()
+    add_scores({book_id: WEIGHTS[event] * scale(now)}, current_period(now))
+
+
+def record_on_commit(book_id, event):
+    transaction.on_commit(lambda: record(book_id, event))
+
+
+def record_many_on_commit(book_ids, event):
+    now = timezone.now()
+    amount, period = WEIGHTS[event] * scale(now), current_period(now)
+    amounts = {book_id: amount for book_id in book_ids}
+    transaction.on_commit(lambda: add_scores(amounts, period))
+
+
+def _incr(key, timeout=None):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.set(key, 1, timeout=timeout)
+        return 1
+
+
+def record_view(book_id):
+    """Count a page view in the shared cache; costs no query."""
+    _incr(VIEW_COUNT_KEY.format(book_id))
+    if cache.add(VIEW_PENDING_KEY.format(book_id), 1, timeout=VIEW_PENDING_TIMEOUT):
+        slot = _incr(VIEW_SEQ_KEY)
+        cache.set(VIEW_SLOT_KEY.format(slot), book_id, timeout=VIEW_SLOT_TIMEOUT)
+
+
+def drain_views():
+    """
+    Add the page views counted since the last drain to the scores, weighted
+    as of now. Returns the number of views drained.
+    """
+    if not cache.add(VIEW_DRAIN_LOCK_KEY, 1, timeout=5 * 60):
+        return 0
+    try:
+        drained, last = cache.get(VIEW_DRAINED_KEY, 0), cache.get(VIEW_SEQ_KEY, 0)
+        if last <= drained:
+            return 0
+        slot_keys = [VIEW_SLOT_KEY.format(slot) for slot in range(drained + 1, last + 1)]
+        book_ids = set(cache.get_many(slot_keys).values())
+        # Views from now on give their book a new slot, so none are lost between reading and resetting.
+        cache.delete_many([VIEW_PENDING_KEY.format(book_id) for book_id in book_ids])
+        counts = cache.get_many([VIEW_COUNT_KEY.format(book_id) for book_id in book_ids])
+        views = {}
+        for book_id in book_ids:
+            key = VIEW_COUNT_KEY.format(book_id)
+            count = counts.get(key, 0)
+            if count:
+                try:
+                    cache.decr(key, count)
+                except ValueError:
+                    pass
+                views[book_id] = count
+        now = timezone.now()
+        amount = WEIGHTS['view'] * scale(now)
+        add_scores({book_id: count * amount for book_id, count in views.items()}, current_period(now))
+        cache.set(VIEW_DRAINED_KEY, last, timeout=None)
+        cache.delete_many(slot_keys)
+        return sum(views.values())
+    finally:
+        cache.delete(VIEW_DRAIN_LOCK_KEY)
+
+
+def compute_trending(limit=TRENDING_SIZE):
+    """Read-only: rows compact() hasn't rebased yet are scaled by their period here."""
+    now = timezone.now()
+    current = scale(now)
+    rows = BookPopularity.objects.filter(book__status=Books.Status.PUBLISHED).annotate(
+        current_score=F('score') * _period_factor(F('period') - Value(current_period(now))),
+    ).order_by('-current_score').values_list(
+        'book_id', 'book__title', 'book__author__first_name', 'book__author__last_name', 'current_score'
+    )[:limit]
+    return [
+        {'id': book_id, 'title': title, 'author_name': f'{first_name} {last_name}', 'score': round(score / current, 3)}
+        for book_id, title, first_name, last_name, score in rows
+    ]
+
+
+def get_trending(limit=TRENDING_SIZE):
+    """The precomputed leaderboard; at most one index scan every CACHE_TIMEOUT."""
+    return site_cache.get_or_set('trending', 'top', compute_trending, CACHE_TIMEOUT)[:limit]
+
+
+def compact():
+    """
+    Drain counted page views, rebase rows to the current period, drop books
+    whose score has decayed away and refresh the cached leaderboard. Returns
+    the number of rows dropped.
+    """
+    drain_views()
+    rebase()
+    dropped, _ = BookPopularity.objects.filter(score__lt=MIN_SCORE * scale()).delete()
+    site_cache.set('trending', 'top', compute_trending(), CACHE_TIMEOUT)
+    return dropped
@@ -0,0 +1,237 @@
+"""
+Precomputed related books, stored as RelatedBook rows of two kinds.
+
+Co-occurrence ("readers also bookmarked or bought"): bookmarks and purchases
+form a binary user x book matrix X. Co-occurrence is C = X.T @ X, scored as
+cosine similarity C_ij / sqrt(n_i * n_j), where n is the number of readers of
+a book.
+
+Content: cosine similarity of TF-IDF vectors, see books.similarity. It also
+covers new books that nobody has read yet.
+"""
+import numpy as np
+from scipy import sparse
+from django.core.cache import cache
+from django.db import transaction
+from librarysite.cache import bump_on_commit
+from subscriptions.models import BookPurchase
+from .models import Books, Bookmarks, PendingRelatedRefresh, RelatedBook
+from . import similarity
+
+TOP_K = 10
+# Bookmark, purchase and book content changes are queued and applied
+# together, at most every REFRESH_DELAY seconds.
+REFRESH_DELAY = 60
+REFRESH_QUEUED_KEY = 'related:refresh_queued'
+# An incremental refresh reads every interaction of the changed books'
+# readers. Books with more readers than this wait for the full rebuild,
+# where one more reader barely moves their scores.
+MAX_INCREMENTAL_READERS = 1000
+# How many of a changed book's closest books get their own lists recomputed.
+CONTENT_CANDIDATES = 50
+
+
+def _interactions(user_ids=None, book_ids=None):
+    """Distinct (user_id, book_id) pairs from bookmarks and purchases."""
+    bookmarks = Bookmarks.objects.values_list('profile__user_id', 'book_id')
+    purchases = BookPurchase.objects.values_list('user_id', 'book_id')
+    if user_ids is not None:
+        bookmarks = bookmarks.filter(profile__user_id__in=user_ids)
+        purchases = purchases.filter(user_id__in=user_ids)
+    if book_ids is not None:
+        bookmarks = bookmarks.filter(book_id__in=book_ids)
+        purchases = purchases.filter(book_id__in=book_ids)
+    return np.array(list(bookmarks.union(purchases)), dtype=np.int64).reshape(-1, 2)
+
+
+def reader_counts(book_ids):
+    books, counts = np.unique(_interactions(book_ids=book_ids)[:, 1], return_counts=True)
+    return dict(zip(books.tolist(), counts.tolist()))
+
+
+def top_neighbours(pairs, rows=None, counts=None, top_k=TOP_K):
+    """
+    Return (book_ids, related_ids, scores) arrays holding the ``top_k`` best
+    neighbours of each book in ``rows`` (every book in ``pairs`` by default).
+    ``counts`` maps book id to reader count when ``pairs`` only covers some
+    readers; otherwise counts are taken from ``pairs``.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(pairs):
+        return empty, empty, np.empty(0)
+    user_ids, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    book_ids, book_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (user_index, book_index)), shape=(len(user_ids), len(book_ids))
+    )
+    if counts is None:
+        readers = np.asarray(matrix.sum(axis=0)).ravel()
+    else:
+        readers = np.array([counts.get(book_id, 0) for book_id in book_ids.tolist()], dtype=np.float32)
+
+    if rows is None:
+        row_index = np.arange(len(book_ids))
+    else:
+        row_index = np.flatnonzero(np.isin(book_ids, list(rows)))
+
+    cooccurrence = (matrix[:, row_index].T @ matrix).tocoo()
+    row, col, together = cooccurrence.row, cooccurrence.col, cooccurrence.data
+    keep = col != row_index[row]
+    row, col, together = row[keep], col[keep], together[keep]
+    scores = together / np.sqrt(readers[row_index[row]] * readers[col])
+
+    # Best score first within each row, ties broken by book id.
+    order = np.lexsort((col, -scores, row))
+    row, col, scores = row[order], col[order], scores[order]
+    rank = np.arange(len(row)) - np.searchsorted(row, row, side='left')
+    keep = rank < top_k
+    return book_ids[row_index[row[keep]]], book_ids[col[keep]], scores[keep].astype(float)
+
+
+def store_neighbours(kind, book_ids, related_ids, scores, rows=None):
+    """Replace the stored neighbours of ``rows`` (all books of ``kind`` when None)."""
+    with transaction.atomic():
+        stale = RelatedBook.objects.filter(kind=kind)
+        if rows is not None:
+            stale = stale.filter(book_id__in=rows)
+        stale.delete()
+        RelatedBook.objects.bulk_create(
+            [
+                RelatedBook(book_id=book_id, related_id=related_id, kind=kind, score=score)
+                for book_id, related_id, score in zip(book_ids.tolist(), related_ids.tolist(), scores.tolist())
+            ],
+            batch_size=1000,
+        )
+        bump_on_commit('related')
+
+
+def refresh_cooccurrence(book_ids=None, user_ids=None, top_k=TOP_K):
+    """
+    Rebuild co-occurrence neighbours. With no arguments every book is rebuilt.
+    Otherwise only the given books are, plus every book read by ``user_ids``:
+    a reader adding or removing a book changes the co-occurrence of all of
+    their books. Books outside that set keep their neighbours until the next
+    full rebuild, even though a changed reader count shifts their scores
+    slightly. So do books with more than MAX_INCREMENTAL_READERS readers.
+    """
+    if book_ids is None and user_ids is None:
+        neighbours = top_neighbours(_interactions(), top_k=top_k)
+        store_neighbours(RelatedBook.Kind.COOCCURRENCE, *neighbours)
+        return len(neighbours[0])
+
+    rows = set(book_ids or ())
+    if user_ids:
+        rows.update(_interactions(user_ids=user_ids)[:, 1].tolist())
+    if not rows:
+        return 0
+    row_pairs = _interactions(book_ids=rows)
+    books, counts = np.unique(row_pairs[:, 1], return_counts=True)
+    heavy = books[counts > MAX_INCREMENTAL_READERS].tolist()
+    rows.difference_update(heavy)
+    readers = np.unique(row_pairs[~np.isin(row_pairs[:, 1], heavy), 0])
+    if not rows or not len(readers):
+        return 0
+    pairs = _interactions(user_ids=readers.tolist())
+    counts = reader_counts(np.unique(pairs[:, 1]).tolist())
+    neighbours = top_neighbours(pairs, rows=rows, counts=counts, top_k=top_k)
+    store_neighbours(RelatedBook.Kind.COOCCURRENCE, *neighbours, rows=rows)
+    return len(neighbours[0])
+
+
+def mark_for_refresh(user_id, book_ids):
+    """
+    Queue a reader's changed books for refresh_pending, in the caller's
+    transaction, and make sure a run is scheduled once it commits.
+    """
+    PendingRelatedRefresh.objects.bulk_create(
+        [PendingRelatedRefresh(user_id=user_id, book_id=book_id) for book_id in book_ids]
+    )
+    transaction.on_commit(schedule_pending_refresh, robust=True)
+
+
+def mark_content_changed(book_ids):
+    """Like mark_for_refresh, for books whose title, tags, description or status changed."""
+    PendingRelatedRefresh.objects.bulk_create(
+        [PendingRelatedRefresh(kind=RelatedBook.Kind.CONTENT, book_id=book_id) for book_id in book_ids]
+    )
+    transaction.on_commit(schedule_pending_refresh, robust=True)
+
+
+def schedule_pending_refresh():
+    """Queue a refresh_pending_related_books run REFRESH_DELAY from now unless one is already queued."""
+    from .tasks import refresh_pending_related_books
+
+    if cache.add(REFRESH_QUEUED_KEY, 1, timeout=2 * REFRESH_DELAY):
+        refresh_pending_related_books.apply_async(countdown=REFRESH_DELAY)
+
+
+def refresh_pending(top_k=TOP_K):
+    """
+    Apply every queued change, with one incremental refresh per kind.
+    Returns the number of neighbours stored.
+    """
+    pending = list(PendingRelatedRefresh.objects.order_by('id').values_list('id', 'kind', 'user_id', 'book_id'))
+    if not pending:
+        return 0
+    cooccurrence = [(user_id, book_id) for _, kind, user_id, book_id in pending
+                    if kind == RelatedBook.Kind.COOCCURRENCE]
+    content = {book_id for _, kind, _, book_id in pending if kind == RelatedBook.Kind.CONTENT}
+    stored = 0
+    if cooccurrence:
+        stored += refresh_cooccurrence({book_id for _, book_id in cooccurrence},
+                                       {user_id for user_id, _ in cooccurrence}, top_k=top_k)
+    if content:
+        stored += refresh_content_similarity(content, top_k=top_k)
+    # Changes queued meanwhile have higher ids and wait for the next run.
+    PendingRelatedRefresh.objects.filter(id__lte=pending[-1][0]).delete()
+    return stored
+
+
+def refresh_content_similarity(book_ids=None, top_k=TOP_K):
+    """
+    Rebuild content neighbours. With no arguments the TF-IDF index is rebuilt
+    from scratch (new vocabulary and IDF) along with every list. Otherwise the
+    given books are re-vectorized with the current vocabulary (or dropped when
+    no longer published), and lists are recomputed for them, for the books
+    that listed them and for their closest books, which may now list them.
+    """
+    kind = RelatedBook.Kind.CONTENT
+    if book_ids is None:
+        index = similarity.SimilarityIndex.build(*similarity.load_documents())
+        similarity.save_index(index)
+        neighbours = index.neighbours(top_k=top_k)
+        store_neighbours(kind, *neighbours)
+        return len(neighbours[0])
+
+    book_ids = set(book_ids)
+    index, found = similarity.update_index(book_ids)
+    if index is None:
+        return 0
+    rows = book_ids | set(RelatedBook.objects.filter(kind=kind, related_id__in=book_ids).values_list(
+        'book_id', flat=True))
+    rows.update(index.neighbours(found.tolist(), top_k=CONTENT_CANDIDATES)[1].tolist())
+    listed, related, scores = index.neighbours(rows, top_k=top_k)
+    # Another worker may have removed a book since this process loaded the snapshot.
+    published = Books.objects.filter(id__in=set(related.tolist()), status=Books.Status.PUBLISHED)
+    keep = np.isin(related, list(published.values_list('id', flat=True)))
+    store_neighbours(kind, listed[keep], related[keep], scores[keep], rows=rows)
+    return int(keep.sum())
+
+
+def related_books(book_id, kind=RelatedBook.Kind.COOCCURRENCE, limit=TOP_K):
+    """Published neighbours of a book, best first, in one indexed query."""
+    return list(
+        RelatedBook.objects.filter(book_id=book_id, kind=kind, related__status=Books.Status.PUBLISHED)
+        .select_related('related__author').order_by('-score')[:limit]
+    )
+
+
+def related_books_by_kind(book_id, limit=TOP_K):
+    """Neighbours of every kind, in one query: {kind: [RelatedBook, ...]}."""
+    related = {}
+    for item in (RelatedBook.objects.filter(book_id=book_id, related__status=Books.Status.PUBLISHED)
+                 .select_related('related__author').order_by('kind', '-score')):
+        neighbours = related.setdefault(item.kind, [])
+        if len(neighbours) < limit:
+            neighbours.append(item)
+    return related
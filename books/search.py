@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.functions import Concat, Greatest
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import Books, Author, BookPage, TaggedBook
+from . import search_index
+
+SEARCH_CONFIG = 'english'
+TRIGRAM_THRESHOLD = 0.3
+# Placeholders for highlighted words; they survive HTML escaping unchanged.
+HIGHLIGHT_START, HIGHLIGHT_STOP = '\x02', '\x03'
+SNIPPET_RADIUS = 120
+
+
+def memory_index_enabled():
+    return settings.BOOKS_SEARCH_BACKEND == 'memory'
+
+
+def full_text_enabled():
+    return connection.vendor == 'postgresql'
+
+
+class IndexedResults:
+    def __init__(self, ids, queryset=None):
+        self.ids = ids
+        self.queryset = Books.objects.select_related('author') if queryset is None else queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        ids = self.ids[item] if isinstance(item, slice) else [self.ids[item]]
+        books = self.queryset.filter(id__in=list(ids)).in_bulk()
+        results = [books[book_id] for book_id in ids if book_id in books]
+        return results if isinstance(item, slice) else results[0]
+
+
+def update_search_vectors(book_ids):
+    # One UPDATE for the whole set, so bulk imports don't pay a query per book.
+    if not full_text_enabled():
+        return
+    author_name = Author.objects.filter(pk=OuterRef('author_id')).annotate(
+        name=Concat('first_name', Value(' '), 'last_name')
+    ).values('name')
+    tag_names = TaggedBook.objects.filter(content_object_id=OuterRef('pk')).values('content_object_id').annotate(
+        names=StringAgg('tag__name', ' ')
+    ).values('names')
+    Books.objects.filter(id__in=book_ids).update(search_vector=(
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(author_name), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(tag_names), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def update_page_search_vectors(book_id):
+    if full_text_enabled():
+        BookPage.objects.filter(book_id=book_id).update(search_vector=SearchVector('text', config=SEARCH_CONFIG))
+
+
+def highlight(snippet):
+    snippet = escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    return mark_safe(snippet)
+
+
+def _snippet(text, query):
+    position = text.lower().find(query.lower())
+    if position < 0:
+        return text[:SNIPPET_RADIUS * 2]
+    start, end = max(position - SNIPPET_RADIUS, 0), position + len(query)
+    return (text[start:position] + HIGHLIGHT_START + text[position:end] + HIGHLIGHT_STOP
+            + text[end:end + SNIPPET_RADIUS])
+
+
+def search_pages(query, limit=10, entitlements=None):
+    """
+    Pages of published books whose extracted PDF text matches ``query``.
+    Pages of books that ``entitlements`` allow viewing get a ``snippet``
+    ready to render; for all others it is None, so paid text only reaches
+    readers who could open the PDF anyway.
+    """
+    pages = BookPage.objects.filter(book__status=Books.Status.PUBLISHED).select_related('book')
+    columns = ('id', 'number', 'book__id', 'book__title')
+    if entitlements is None or not (entitlements.has_active_subscription or entitlements.book_ids):
+        readable = None
+    elif entitlements.has_active_subscription:
+        readable = Q()
+    else:
+        readable = Q(book_id__in=list(entitlements.book_ids))
+
+    if full_text_enabled():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        headline = SearchHeadline('text', search_query, config=SEARCH_CONFIG,
+                                  start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP)
+        if readable is None:
+            headline = Value(None, output_field=TextField())
+        elif readable:
+            headline = Case(When(readable, then=headline), default=Value(None), output_field=TextField())
+        pages = list(pages.only(*columns).filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query), headline=headline,
+        ).order_by('-rank', 'book_id', 'number')[:limit])
+        for page in pages:
+            page.snippet = highlight(page.headline) if page.headline is not None else None
+        return pages
+
+    if readable is not None:
+        columns += ('text',)
+    pages = list(pages.only(*columns).filter(text__icontains=query).order_by('book_id', 'number')[:limit])
+    for page in pages:
+        readable_page = readable is not None and entitlements.can_view(page.book_id)
+        page.snippet = highlight(_snippet(page.text, query)) if readable_page else None
+    return pages
+
+
+def search_books(query, queryset=None):
+    if queryset is None:
+        queryset = Books.objects.select_related('author')
+
+    books = queryset.filter(status=Books.Status.PUBLISHED)
+
+    if memory_index_enabled():
+        # The index lags behind until the next sync, so the filter also drops books unpublished since.
+        return IndexedResults(search_index.search(query)[::-1], books)
+
+    if full_text_enabled():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return books.annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            similarity=TrigramSimilarity('title', query),
+        ).filter(
+            Q(search_vector=search_query) | Q(title__trigram_similar=query)
+        ).order_by('-rank', '-similarity', '-id')
+
+    tagged = Books.objects.filter(tags__name__icontains=query).values('id')
+    author_match = Q(author__first_name__icontains=query) | Q(author__last_name__icontains=query)
+    return books.annotate(
+        rank=(
+            Case(When(title__icontains=query, then=4), default=0, output_field=IntegerField())
+            + Case(When(author_match, then=2), default=0, output_field=IntegerField())
+            + Case(When(id__in=tagged, then=2), default=0, output_field=IntegerField())
+            + Case(When(description__icontains=query, then=1), default=0, output_field=IntegerField())
+        )
+    ).filter(rank__gt=0).order_by('-rank', '-id')
+
+
+def search_authors(query):
+    name_match = Q(first_name__icontains=query) | Q(last_name__icontains=query)
+
+    if full_text_enabled():
+        return Author.objects.annotate(
+            similarity=Greatest(TrigramSimilarity('first_name', query), TrigramSimilarity('last_name', query)),
+        ).filter(name_match | Q(similarity__gt=TRIGRAM_THRESHOLD)).order_by('-similarity', 'last_name', 'id')
+
+    return Author.objects.filter(name_match).order_by('last_name', 'id')
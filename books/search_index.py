@@ -0,0 +1,319 @@
+import fcntl
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+SNAPSHOT_VERSION = 2
+TOKEN_RE = re.compile(r'\w+')
+# Changes are written to the snapshot by one sync_search_index task at most
+# every SYNC_DELAY seconds. Each sync also re-reads books updated within
+# SYNC_OVERLAP of the previous one, whose transactions may have committed late.
+SYNC_DELAY = 30
+SYNC_OVERLAP = timedelta(minutes=5)
+SYNC_QUEUED_KEY = 'search_index:sync_queued'
+
+
+def tokenize(text):
+    return [sys.intern(token) for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def book_tokens(book):
+    tokens = tokenize(book.title)
+    tokens += tokenize(book.author.first_name)
+    tokens += tokenize(book.author.last_name)
+    tokens += tokenize(book.description)
+    for tag in book.tags.all():
+        tokens += tokenize(tag.name)
+    return tokens
+
+
+def _intersect(left, right):
+    if len(left) > len(right):
+        left, right = right, left
+    result = array('q')
+    lo = 0
+    for book_id in left:
+        lo = bisect_left(right, book_id, lo)
+        if lo == len(right):
+            break
+        if right[lo] == book_id:
+            result.append(book_id)
+    return result
+
+
+def _union(postings):
+    merged = set()
+    for ids in postings:
+        merged.update(ids)
+    return array('q', sorted(merged))
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.synced_at = None
+        self._sorted_tokens = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, book_id, tokens):
+        self.remove(book_id)
+        tokens = tuple(sorted(set(tokens)))
+        self.documents[book_id] = tokens
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                self.postings[token] = array('q', [book_id])
+                self._sorted_tokens = None
+            else:
+                ids.insert(bisect_left(ids, book_id), book_id)
+
+    def remove(self, book_id):
+        for token in self.documents.pop(book_id, ()):
+            ids = self.postings[token]
+            pos = bisect_left(ids, book_id)
+            if pos < len(ids) and ids[pos] == book_id:
+                del ids[pos]
+            if not ids:
+                del self.postings[token]
+                self._sorted_tokens = None
+
+    def lookup(self, term, prefix=False):
+        if not prefix:
+            return self.postings.get(term, array('q'))
+
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        tokens = self._sorted_tokens
+        matches = []
+        pos = bisect_left(tokens, term)
+        while pos < len(tokens) and tokens[pos].startswith(term):
+            matches.append(self.postings[tokens[pos]])
+            pos += 1
+        return _union(matches)
+
+    def search(self, query):
+        """
+        Whitespace-separated terms are ANDed, ``OR`` separates alternatives
+        and a trailing ``*`` turns a term into a prefix match.
+        """
+        groups, current = [], []
+        for word in query.split():
+            if word == 'OR':
+                groups.append(current)
+                current = []
+            else:
+                current.append(word)
+        groups.append(current)
+
+        results = []
+        for group in groups:
+            ids = None
+            for word in group:
+                prefix = word.endswith('*')
+                for term in tokenize(word):
+                    postings = self.lookup(term, prefix=prefix)
+                    ids = postings if ids is None else _intersect(ids, postings)
+            if ids:
+                results.append(ids)
+        return _union(results) if len(results) > 1 else (results[0] if results else array('q'))
+
+    def dump(self, path):
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'postings': {token: ids.tobytes() for token, ids in self.postings.items()},
+            'documents': self.documents,
+            'synced_at': self.synced_at,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.search_index')
+        with os.fdopen(fd, 'wb') as snapshot:
+            pickle.dump(data, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as snapshot:
+            data = pickle.load(snapshot)
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported search index snapshot version.')
+        index = cls()
+        for token, raw in data['postings'].items():
+            ids = array('q')
+            ids.frombytes(raw)
+            index.postings[sys.intern(token)] = ids
+        index.documents = data['documents']
+        index.synced_at = data['synced_at']
+        return index
+
+    @classmethod
+    def build(cls):
+        from .models import Books
+
+        index = cls()
+        index.synced_at = timezone.now()
+        books = Books.objects.filter(status=Books.Status.PUBLISHED).select_related('author').prefetch_related('tags')
+        for book in books.iterator(chunk_size=2000):
+            index.add(book.id, book_tokens(book))
+        return index
+
+
+_lock = threading.RLock()
+_index = None
+_snapshot_mtime = None
+
+
+def _snapshot_path():
+    return settings.BOOKS_SEARCH_INDEX_PATH
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _writer_lock():
+    """Only one process at a time reads, updates and rewrites the snapshot."""
+    path = _snapshot_path() + '.lock'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _save(index):
+    global _index, _snapshot_mtime
+    path = _snapshot_path()
+    index.dump(path)
+    _index, _snapshot_mtime = index, _mtime(path)
+
+
+def _synced_path():
+    return _snapshot_path() + '.synced'
+
+
+def _load_synced_at(index):
+    """When the last sync started; it is saved beside the snapshot when nothing changed."""
+    try:
+        with open(_synced_path()) as synced:
+            synced_at = datetime.fromisoformat(synced.read().strip())
+    except (FileNotFoundError, ValueError):
+        return index.synced_at
+    return max(synced_at, index.synced_at)
+
+
+def _save_synced_at(synced_at):
+    path = _synced_path()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.search_index')
+    with os.fdopen(fd, 'w') as synced:
+        synced.write(synced_at.isoformat())
+    os.replace(tmp_path, path)
+
+
+def _build_and_save():
+    from .models import SearchIndexTombstone
+
+    # The build reads no deleted book, so the tombstones written before it are done.
+    last_tombstone = SearchIndexTombstone.objects.order_by('-pk').values_list('pk', flat=True).first()
+    index = InvertedIndex.build()
+    _save(index)
+    _save_synced_at(index.synced_at)
+    if last_tombstone is not None:
+        SearchIndexTombstone.objects.filter(pk__lte=last_tombstone).delete()
+    return index
+
+
+def get_index():
+    global _index, _snapshot_mtime
+    with _lock:
+        path = _snapshot_path()
+        mtime = _mtime(path)
+        if _index is not None and mtime == _snapshot_mtime:
+            return _index
+        if mtime is None:
+            with _writer_lock():
+                # Another process may have written it while we waited.
+                if _mtime(path) is None:
+                    return _build_and_save()
+            mtime = _mtime(path)
+        _index, _snapshot_mtime = InvertedIndex.load(path), mtime
+        return _index
+
+
+def rebuild_index():
+    with _lock, _writer_lock():
+        return _build_and_save()
+
+
+def sync_index():
+    """
+    Apply the books changed since the last sync and drop unpublished and
+    deleted ones (recorded as SearchIndexTombstone rows), then rewrite the
+    snapshot once if any entry changed. The sync's start time is saved either
+    way, so idle syncs keep the next one's window short. Returns the number
+    of changed entries.
+    """
+    from .models import Books, SearchIndexTombstone
+
+    with _lock, _writer_lock():
+        path = _snapshot_path()
+        if _mtime(path) is None:
+            return len(_build_and_save())
+        index = InvertedIndex.load(path)
+        started = timezone.now()
+        changed = Books.objects.filter(updated_at__gte=_load_synced_at(index) - SYNC_OVERLAP).select_related(
+            'author').prefetch_related('tags')
+        count = 0
+        for book in changed.iterator(chunk_size=2000):
+            if book.status == Books.Status.PUBLISHED:
+                tokens = book_tokens(book)
+                if index.documents.get(book.id) != tuple(sorted(set(tokens))):
+                    index.add(book.id, tokens)
+                    count += 1
+            elif book.id in index.documents:
+                index.remove(book.id)
+                count += 1
+        tombstones = dict(SearchIndexTombstone.objects.values_list('pk', 'book_id'))
+        for book_id in set(tombstones.values()):
+            if book_id in index.documents:
+                index.remove(book_id)
+                count += 1
+        if count:
+            index.synced_at = started
+            _save(index)
+        _save_synced_at(started)
+        if tombstones:
+            SearchIndexTombstone.objects.filter(pk__in=tombstones).delete()
+        return count
+
+
+def schedule_sync():
+    """
+    Queue a sync_search_index run SYNC_DELAY from now unless one is already
+    queued; every change until it starts is picked up by that run.
+    """
+    from .tasks import sync_search_index
+
+    if cache.add(SYNC_QUEUED_KEY, 1, timeout=2 * SYNC_DELAY):
+        sync_search_index.apply_async(countdown=SYNC_DELAY)
+
+
+def search(query):
+    with _lock:
+        return get_index().search(query)
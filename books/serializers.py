@@ -1,56 +1,201 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Books, Author, Comments, Bookmarks
-from subscriptions.models import Subscription, BookPurchase
+from .models import Books, Author, Comments, Bookmarks, BookPdfInfo, RelatedBook
+from subscriptions.entitlements import get_entitlements
+from .bookmarks import MAX_BULK_BOOKMARKS
 from accounts.serializers import ProfileSerializer
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+def _split_param(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def eager_loading_plan(serializer, prefix=''):
+    """
+    Returns (select_related, prefetch_related, only) for the fields the
+    serializer will render. ``only`` is None when a field reads something
+    that cannot be mapped to a column, e.g. a property.
+    """
+    model = serializer.Meta.model
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+    select, prefetch, only = [], [], [prefix + model._meta.pk.name]
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in dependencies:
+            only += [prefix + column for column in dependencies[name]]
+        if field.source == '*' or '.' in field.source:
+            if name not in dependencies:
+                only = None
+            continue
+        path = prefix + field.source
+
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+            child_select, child_prefetch, _ = eager_loading_plan(field.child)
+            queryset = field.child.Meta.model._default_manager.select_related(*child_select)
+            prefetch.append(Prefetch(path, queryset=queryset.prefetch_related(*child_prefetch)))
+        elif isinstance(field, serializers.ModelSerializer):
+            nested_select, nested_prefetch, nested_only = eager_loading_plan(field, prefix=f'{path}__')
+            select += [path] + nested_select
+            prefetch += nested_prefetch
+            if only is not None:
+                only += [path] + (nested_only or [])
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.append(path)
+        elif isinstance(field, serializers.RelatedField):
+            if not isinstance(field, serializers.PrimaryKeyRelatedField):
+                select.append(path)
+            if only is not None:
+                only.append(path)
+        elif name not in dependencies and only is not None:
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or not model_field.concrete:
+                only = None
+            else:
+                only.append(path)
+    return select, prefetch, only
+
+
+class EagerLoadingMixin:
+    @classmethod
+    def setup_eager_loading(cls, queryset, serializer=None, extra_fields=()):
+        if serializer is None:
+            serializer = cls()
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        select, prefetch, only = eager_loading_plan(serializer)
+        queryset = queryset.select_related(*select).prefetch_related(*prefetch)
+        if only is not None:
+            queryset = queryset.only(*only, *extra_fields)
+        return queryset
+
+
+class DynamicFieldsMixin:
+    """
+    ``?fields=a,b`` limits the top-level representation to those fields and
+    ``?expand=c`` adds fields left out of the default one. List items default
+    to ``Meta.list_fields`` when it is declared.
+    """
+
+    def is_list_item(self):
+        return isinstance(self.parent, serializers.ListSerializer)
+
+    def is_top_level(self):
+        return self.parent is None or (self.is_list_item() and self.parent.parent is None)
+
+    def get_field_selection(self):
+        request = self.context.get('request')
+        if request is None or not self.is_top_level():
+            return [], []
+        params = getattr(request, 'query_params', request.GET)
+        return _split_param(params.get('fields')), _split_param(params.get('expand'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expanded = self.get_field_selection()
+        if requested:
+            selected = set(requested)
+        else:
+            default = getattr(self.Meta, 'list_fields', None) if self.is_list_item() else None
+            selected = set(default or fields) | set(expanded)
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class AuthorBookSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Books
+        fields = ['id', 'title', 'date']
+
+
+class AuthorSerializer(EagerLoadingMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'first_name', 'last_name', 'birth_date', 'about']
         read_only_fields = ['id', 'first_name', 'last_name', 'birth_date', 'about']
 
 
-class CommentsSerializer(serializers.ModelSerializer):
+class AuthorStatsSerializer(AuthorSerializer):
+    """The author API: the author with their published books' stats and latest books."""
+    recent_books = serializers.SerializerMethodField()
+
+    class Meta(AuthorSerializer.Meta):
+        fields = [*AuthorSerializer.Meta.fields, 'book_count', 'last_published', 'recent_books']
+        read_only_fields = fields
+        # Prefetched by the view as ``published_books``.
+        field_dependencies = {'recent_books': []}
+
+    def get_recent_books(self, obj):
+        return AuthorBookSerializer(obj.published_books, many=True).data
+
+
+class CommentsSerializer(EagerLoadingMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
 
     class Meta:
         model = Comments
         fields = ['id', 'books', 'profile', 'content', 'created_at', 'updated_at', 'is_modified']
         read_only_fields = ['id', 'profile', 'created_at', 'updated_at', 'is_modified']
+        field_dependencies = {'is_modified': ['created_at', 'updated_at']}
 
 
-class BookSerializer(serializers.ModelSerializer):
+class CommentFeedSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Comments
+        fields = ['id', 'username', 'content', 'created_at', 'is_modified']
+        read_only_fields = fields
+
+
+class BookPdfInfoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookPdfInfo
+        fields = ['status', 'page_count', 'thumbnail']
+        read_only_fields = fields
+
+
+class BookSerializer(EagerLoadingMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
+    author_name = serializers.StringRelatedField(source='author', read_only=True)
     tags = serializers.SlugRelatedField(
         many=True,
         read_only=True,
         slug_field='slug'
     )
     comments = CommentsSerializer(many=True, read_only=True)
+    pdf_info = BookPdfInfoSerializer(read_only=True)
     can_view_pdf = serializers.SerializerMethodField()
 
     class Meta:
         model = Books
-        fields = ['id', 'title', 'author', 'description', 'date', 'price', 'tags', 'status', 'pdf_file', 'comments',
-                  'can_view_pdf']
-        read_only_fields = ['id', 'title', 'author', 'description', 'date', 'price', 'tags', 'status', 'pdf_file',
-                            'comments', 'can_view_pdf']
+        fields = ['id', 'title', 'author', 'author_name', 'description', 'date', 'price', 'tags', 'status', 'pdf_file',
+                  'pdf_info', 'comments', 'can_view_pdf']
+        read_only_fields = ['id', 'title', 'author', 'author_name', 'description', 'date', 'price', 'tags', 'status',
+                            'pdf_file', 'pdf_info', 'comments', 'can_view_pdf']
+        list_fields = ['id', 'title', 'author_name', 'price', 'tags']
+        field_dependencies = {'can_view_pdf': []}
 
     def get_can_view_pdf(self, obj):
         request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
+        if not request:
             return False
-        user = request.user
+        return get_entitlements(request.user).can_view(obj.id)
 
-        try:
-            subscription = user.subscription
-            if subscription.is_active:
-                return True
-        except Subscription.DoesNotExist:
-            pass
 
-        return BookPurchase.objects.filter(user=user, book=obj).exists()
+class RelatedBookSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='related_id', read_only=True)
+    title = serializers.CharField(source='related.title', read_only=True)
+    author_name = serializers.StringRelatedField(source='related.author', read_only=True)
+
+    class Meta:
+        model = RelatedBook
+        fields = ['id', 'title', 'author_name', 'score']
+        read_only_fields = fields
 
 
 class BookmarksSerializer(serializers.ModelSerializer):
@@ -58,3 +203,8 @@ class BookmarksSerializer(serializers.ModelSerializer):
         model = Bookmarks
         fields = ['id', 'profile', 'book', 'date_added']
         read_only_fields = ['id', 'profile', 'date_added']
+
+
+class BulkBookmarksSerializer(serializers.Serializer):
+    books = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                  max_length=MAX_BULK_BOOKMARKS)
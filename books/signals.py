@@ -0,0 +1,138 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Books, Author, Comments, BookPdfInfo, Bookmarks, SearchIndexTombstone
+from .search import update_search_vectors, memory_index_enabled
+from .search_index import schedule_sync
+from .stats import update_author_stats
+from taggit.models import Tag
+from librarysite.cache import bump_on_commit
+from .popularity import record_on_commit
+from .recommendations import mark_content_changed, mark_for_refresh
+from .tasks import ingest_pdf
+
+
+def schedule_search_update(book_ids):
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    transaction.on_commit(lambda: update_search_vectors(book_ids))
+    if memory_index_enabled():
+        transaction.on_commit(schedule_sync, robust=True)
+
+
+def schedule_similarity_update(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        mark_content_changed(book_ids)
+
+
+def schedule_pdf_ingestion(book):
+    processed = BookPdfInfo.objects.filter(book_id=book.pk).values_list('source_name', flat=True).first()
+    if (book.pdf_file.name or '') == (processed or ''):
+        return
+    book_id = book.pk
+    transaction.on_commit(lambda: ingest_pdf.delay(book_id), robust=True)
+
+
+@receiver(pre_save, sender=Books)
+def book_saving(sender, instance, raw=False, **kwargs):
+    # Moving a book to another author changes the stats of both.
+    if raw or instance.pk is None:
+        return
+    instance._previous_author_id = Books.objects.filter(pk=instance.pk).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Books)
+def book_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_author_stats({instance.author_id, getattr(instance, '_previous_author_id', None)} - {None})
+    schedule_search_update([instance.pk])
+    schedule_similarity_update([instance.pk])
+    schedule_pdf_ingestion(instance)
+    bump_on_commit('books', 'authors')
+
+
+@receiver(post_delete, sender=Books)
+def book_deleted(sender, instance, **kwargs):
+    update_author_stats([instance.author_id])
+    if memory_index_enabled():
+        # A deleted book leaves no updated_at for the next sync to find.
+        SearchIndexTombstone.objects.create(book_id=instance.pk)
+    schedule_search_update([instance.pk])
+    schedule_similarity_update([instance.pk])
+    bump_on_commit('books', 'authors')
+
+
+@receiver(m2m_changed, sender=Books.tags.through)
+def book_tags_changed(sender, instance, action, reverse=False, pk_set=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    book_ids = [instance.pk] if isinstance(instance, Books) else list(pk_set or ())
+    Books.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+    schedule_search_update(book_ids)
+    schedule_similarity_update(book_ids)
+    bump_on_commit('books')
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Books.objects.filter(tagged_items__tag=instance).update(updated_at=timezone.now())
+    bump_on_commit('tags')
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    bump_on_commit('authors')
+    if not created:
+        # Book representations embed the author's name.
+        instance.books.update(updated_at=timezone.now())
+        schedule_search_update(instance.books.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    bump_on_commit('authors')
+
+
+@receiver(post_save, sender=Comments)
+def comment_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    changes = {'updated_at': timezone.now()}
+    if created:
+        changes['comment_count'] = F('comment_count') + 1
+        record_on_commit(instance.books_id, 'comment')
+    Books.objects.filter(pk=instance.books_id).update(**changes)
+    bump_on_commit('comments')
+
+
+@receiver(post_delete, sender=Comments)
+def comment_deleted(sender, instance, **kwargs):
+    Books.objects.filter(pk=instance.books_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1, updated_at=timezone.now()
+    )
+    bump_on_commit('comments')
+
+
+def schedule_related_refresh(user_id, book_id):
+    mark_for_refresh(user_id, [book_id])
+
+
+@receiver(post_save, sender=Bookmarks)
+@receiver(post_delete, sender=Bookmarks)
+def bookmark_changed(sender, instance, created=True, raw=False, origin=None, **kwargs):
+    # Queryset deletes come from books.bookmarks, which schedules this once for all rows.
+    if raw or not created or isinstance(origin, QuerySet):
+        return
+    schedule_related_refresh(instance.profile.user_id, instance.book_id)
+    if kwargs['signal'] is post_save:
+        record_on_commit(instance.book_id, 'bookmark')
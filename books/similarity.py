@@ -0,0 +1,236 @@
+"""
+Content similarity between published books: TF-IDF vectors of title, tags
+and description, L2-normalized so that a dot product is the cosine.
+"""
+import heapq
+import math
+import os
+import tempfile
+import threading
+from collections import Counter
+from operator import itemgetter
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from .search_index import tokenize
+
+SNAPSHOT_VERSION = 1
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 2
+# Terms in fewer books than MIN_DF can't connect two books; terms in more
+# than MAX_DF_RATIO of them act as stop words.
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+# Pruning vectors to their heaviest terms bounds the cost of the all-pairs scoring.
+MAX_TERMS = 32
+BATCH_SIZE = 256
+TRANSPOSE_BLOCK_SIZE = 2048
+
+
+def book_terms(title, description, tag_names):
+    return tokenize(title) * TITLE_WEIGHT + tokenize(' '.join(tag_names)) * TAG_WEIGHT + tokenize(description)
+
+
+def load_documents(book_ids=None):
+    """Return (ids, term lists) of the published books, optionally limited to ``book_ids``."""
+    from .models import Books, TaggedBook
+
+    books = Books.objects.filter(status=Books.Status.PUBLISHED)
+    tagged = TaggedBook.objects.filter(content_object__status=Books.Status.PUBLISHED)
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+        tagged = tagged.filter(content_object_id__in=book_ids)
+    tags = {}
+    for book_id, name in tagged.values_list('content_object_id', 'tag__name').iterator(chunk_size=5000):
+        tags.setdefault(book_id, []).append(name)
+
+    ids, documents = [], []
+    for book_id, title, description in books.order_by('id').values_list('id', 'title', 'description').iterator(
+            chunk_size=2000):
+        ids.append(book_id)
+        documents.append(book_terms(title, description, tags.get(book_id, ())))
+    return np.array(ids, dtype=np.int64), documents
+
+
+def _top_k(scores, top_k):
+    """Column indexes of the ``top_k`` best positive scores of each row, best first."""
+    top_k = min(top_k, scores.shape[1])
+    if not top_k:
+        return [np.empty(0, dtype=np.int64)] * scores.shape[0]
+    best = np.argpartition(scores, -top_k, axis=1)[:, -top_k:]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+    return [columns[row_scores > 0] for columns, row_scores in zip(best, best_scores)]
+
+
+class SimilarityIndex:
+    def __init__(self, vocabulary, idf, book_ids, matrix):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.book_ids = book_ids
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    @classmethod
+    def build(cls, book_ids, documents):
+        document_frequency = Counter()
+        for terms in documents:
+            document_frequency.update(set(terms))
+        max_df = max(MIN_DF, int(MAX_DF_RATIO * len(documents)))
+        terms = sorted(term for term, df in document_frequency.items() if MIN_DF <= df <= max_df)
+        vocabulary = {term: column for column, term in enumerate(terms)}
+        idf = np.array(
+            [math.log((1 + len(documents)) / (1 + document_frequency[term])) + 1 for term in terms], dtype=np.float32
+        )
+        index = cls(vocabulary, idf, np.empty(0, dtype=np.int64), sparse.csr_matrix((0, len(terms)), dtype=np.float32))
+        index.book_ids, index.matrix = np.asarray(book_ids, dtype=np.int64), index.vectorize(documents)
+        return index
+
+    def vectorize(self, documents):
+        """
+        Sublinear TF times IDF, one L2-normalized row per document, keeping
+        the MAX_TERMS heaviest terms. Unknown terms are ignored.
+        """
+        idf = self.idf.tolist()
+        rows, columns, weights = [], [], []
+        for row, terms in enumerate(documents):
+            weighted = [
+                (column, (1 + math.log(count)) * idf[column])
+                for column, count in Counter(self.vocabulary[term] for term in terms if term in self.vocabulary).items()
+            ]
+            if len(weighted) > MAX_TERMS:
+                weighted = heapq.nlargest(MAX_TERMS, weighted, key=itemgetter(1))
+            for column, weight in weighted:
+                rows.append(row)
+                columns.append(column)
+                weights.append(weight)
+        matrix = sparse.csr_matrix((weights, (rows, columns)), shape=(len(documents), len(self.vocabulary)),
+                                   dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+    def remove(self, book_ids):
+        keep = ~np.isin(self.book_ids, list(book_ids))
+        if not keep.all():
+            self.book_ids, self.matrix = self.book_ids[keep], self.matrix[keep]
+
+    def upsert(self, book_ids, documents):
+        self.remove(book_ids)
+        if len(book_ids):
+            self.book_ids = np.concatenate([self.book_ids, np.asarray(book_ids, dtype=np.int64)])
+            self.matrix = sparse.vstack([self.matrix, self.vectorize(documents)], format='csr')
+
+    def scores(self, rows):
+        """Dense cosine scores of the given matrix rows against every indexed book, one row each."""
+        # Sparse x dense beats sparse x sparse when, as here, most scores are non-zero.
+        by_book = self.matrix @ self.matrix[rows].T.toarray()
+        # Transposing in blocks keeps each copy in cache; a single transpose is several times slower.
+        scores = np.empty((len(rows), len(self.book_ids)), dtype=np.float32)
+        for start in range(0, len(self.book_ids), TRANSPOSE_BLOCK_SIZE):
+            scores[:, start:start + TRANSPOSE_BLOCK_SIZE] = by_book[start:start + TRANSPOSE_BLOCK_SIZE].T
+        return scores
+
+    def neighbours(self, book_ids=None, top_k=10):
+        """
+        Return (book_ids, related_ids, scores) arrays with the ``top_k`` most
+        similar books of each book in ``book_ids`` (default: all), computed
+        BATCH_SIZE rows at a time.
+        """
+        rows = np.arange(len(self.book_ids)) if book_ids is None else np.flatnonzero(
+            np.isin(self.book_ids, list(book_ids)))
+        found, related, found_scores = [], [], []
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            scores = self.scores(batch)
+            scores[np.arange(len(batch)), batch] = 0
+            for position, columns in enumerate(_top_k(scores, top_k)):
+                found.append(np.full(len(columns), self.book_ids[batch[position]]))
+                related.append(self.book_ids[columns])
+                found_scores.append(scores[position, columns])
+        if not found:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        return np.concatenate(found), np.concatenate(related), np.concatenate(found_scores).astype(float)
+
+    def dump(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.similarity_index')
+        with os.fdopen(fd, 'wb') as snapshot:
+            np.savez(
+                snapshot, version=SNAPSHOT_VERSION, terms=np.array(sorted(self.vocabulary, key=self.vocabulary.get)),
+                idf=self.idf, book_ids=self.book_ids, data=self.matrix.data, indices=self.matrix.indices,
+                indptr=self.matrix.indptr, shape=self.matrix.shape,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != SNAPSHOT_VERSION:
+                raise ValueError('Unsupported similarity index snapshot version.')
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            vocabulary = {term: column for column, term in enumerate(data['terms'].tolist())}
+            return cls(vocabulary, data['idf'], data['book_ids'], matrix)
+
+
+_lock = threading.RLock()
+_index = None
+_snapshot_mtime = None
+
+
+def _snapshot_path():
+    return settings.BOOKS_SIMILARITY_INDEX_PATH
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def save_index(index):
+    global _index, _snapshot_mtime
+    with _lock:
+        path = _snapshot_path()
+        index.dump(path)
+        _index, _snapshot_mtime = index, _mtime(path)
+
+
+def get_index():
+    """
+    The snapshot's index, reloaded when another process has written a newer
+    one, or None until a full rebuild has written the first snapshot.
+    """
+    global _index, _snapshot_mtime
+    with _lock:
+        path = _snapshot_path()
+        mtime = _mtime(path)
+        if mtime is None:
+            return None
+        if _index is None or mtime != _snapshot_mtime:
+            _index, _snapshot_mtime = SimilarityIndex.load(path), mtime
+        return _index
+
+
+def update_index(book_ids):
+    """
+    Re-vectorize ``book_ids`` with the current vocabulary, dropping the ones
+    that are no longer published. Returns (index, ids still indexed), or
+    (None, None) when there is no index yet.
+    """
+    book_ids = set(book_ids)
+    with _lock:
+        index = get_index()
+        if index is None:
+            return None, None
+        found, documents = load_documents(book_ids)
+        index.remove(book_ids - set(found.tolist()))
+        index.upsert(found, documents)
+        save_index(index)
+        return index, found
@@ -0,0 +1,16 @@
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Books, Author
+
+
+def update_author_stats(author_ids):
+    """Recount the published books of the given authors, in one UPDATE."""
+    published = Books.objects.filter(author_id=OuterRef('pk'), status=Books.Status.PUBLISHED).order_by().values(
+        'author_id'
+    )
+    Author.objects.filter(pk__in=author_ids).update(
+        book_count=Coalesce(Subquery(published.annotate(count=Count('pk')).values('count')), 0),
+        last_published=Subquery(published.annotate(last=Max('date')).values('last')),
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,55 @@
+from celery import shared_task
+from . import facets
+
+
+@shared_task
+def refresh_tag_facets():
+    return len(facets.refresh_tag_facets())
+
+
+@shared_task
+def ingest_pdf(book_id):
+    from .pdf_ingest import ingest_book_pdf
+
+    return ingest_book_pdf(book_id)
+
+
+@shared_task
+def compact_popularity():
+    from .popularity import compact
+
+    return compact()
+
+
+@shared_task
+def refresh_related_books(book_ids=None, user_ids=None):
+    from .recommendations import refresh_cooccurrence
+
+    return refresh_cooccurrence(book_ids, user_ids)
+
+
+@shared_task
+def refresh_pending_related_books():
+    from django.core.cache import cache
+    from .recommendations import REFRESH_QUEUED_KEY, refresh_pending
+
+    # Changes from now on queue the next run.
+    cache.delete(REFRESH_QUEUED_KEY)
+    return refresh_pending()
+
+
+@shared_task
+def refresh_similar_books(book_ids=None):
+    from .recommendations import refresh_content_similarity
+
+    return refresh_content_similarity(book_ids)
+
+
+@shared_task
+def sync_search_index():
+    from django.core.cache import cache
+    from .search_index import SYNC_QUEUED_KEY, sync_index
+
+    # Changes from now on queue the next run.
+    cache.delete(SYNC_QUEUED_KEY)
+    return sync_index()
@@ -1,3 +1,1106 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import tempfile
+import pymupdf
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+from accounts.models import MyUser, Profile
+from librarysite import cache as site_cache
+from subscriptions.models import BookPurchase
+from .models import (
+    Books, Author, Bookmarks, Comments, BookPdfInfo, PendingRelatedRefresh, RelatedBook, SearchIndexTombstone
+)
+from . import autocomplete, popularity
+from .pdf_serving import sign_pdf_path
+from .pagination import KeysetPaginator
+from .recommendations import refresh_cooccurrence, refresh_content_similarity, refresh_pending
+from .search import search_books, search_authors
+from .search_index import InvertedIndex, tokenize
+from . import search_index
 
-# Create your tests here.
+
+def create_author(first_name='Leo', last_name='Tolstoy'):
+    return Author.objects.create(first_name=first_name, last_name=last_name, birth_date=date(1828, 9, 9),
+                                 about='Russian writer')
+
+
+def create_book(author, title='War and Peace', description='A novel', status=Books.Status.PUBLISHED, tags=(),
+                **kwargs):
+    kwargs.setdefault('date', date(1869, 1, 1))
+    book = Books.objects.create(title=title, author=author, description=description, price='10.00', status=status,
+                                **kwargs)
+    if tags:
+        book.tags.add(*tags)
+    return book
+
+
+def create_profile(username='reader'):
+    user = MyUser.objects.create_user(email=f'{username}@example.com', username=username, password='secret',
+                                      is_active=True)
+    return Profile.objects.create(user=user)
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        return result
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tolstoy = create_author()
+        cls.dostoevsky = create_author('Fyodor', 'Dostoevsky')
+        cls.war = create_book(cls.tolstoy, 'War and Peace', 'Napoleon invades Russia', tags=['history'])
+        cls.anna = create_book(cls.tolstoy, 'Anna Karenina', 'A story about war of the heart')
+        cls.crime = create_book(cls.dostoevsky, 'Crime and Punishment', 'Raskolnikov', tags=['war'])
+        cls.draft = create_book(cls.tolstoy, 'War draft', status=Books.Status.DRAFT)
+
+    def test_title_matches_rank_first(self):
+        results = list(search_books('war'))
+        self.assertEqual(results[0], self.war)
+        self.assertCountEqual(results, [self.war, self.anna, self.crime])
+
+    def test_matches_author_name(self):
+        self.assertCountEqual(search_books('tolstoy'), [self.war, self.anna])
+
+    def test_excludes_drafts(self):
+        self.assertNotIn(self.draft, search_books('draft'))
+
+    def test_search_authors(self):
+        self.assertEqual(list(search_authors('dostoev')), [self.dostoevsky])
+
+    def test_search_page(self):
+        response = self.client.get(reverse('books:search'), {'query': 'war'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['book_results'].paginator.count, 3)
+
+
+class SearchApiTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author()
+        cls.book = create_book(author)
+
+    def test_search_endpoint(self):
+        response = self.client.get(reverse('books:book-search'), {'q': 'peace'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.book.id)
+
+    def test_search_requires_query(self):
+        response = self.client.get(reverse('books:book-search'))
+        self.assertEqual(response.status_code, 400)
+
+
+class InvertedIndexTests(TestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, tokenize('War and Peace'))
+        self.index.add(2, tokenize('Peace treaty'))
+        self.index.add(3, tokenize('Warlords of history'))
+
+    def test_and_or_prefix_queries(self):
+        self.assertEqual(list(self.index.search('peace')), [1, 2])
+        self.assertEqual(list(self.index.search('war peace')), [1])
+        self.assertEqual(list(self.index.search('war OR treaty')), [1, 2])
+        self.assertEqual(list(self.index.search('war*')), [1, 3])
+
+    def test_remove_and_snapshot_roundtrip(self):
+        self.index.remove(2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.bin')
+            self.index.dump(path)
+            restored = InvertedIndex.load(path)
+        self.assertEqual(list(restored.search('peace')), [1])
+        self.assertNotIn('treaty', restored.postings)
+
+
+class MemorySearchBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(
+            BOOKS_SEARCH_BACKEND='memory',
+            BOOKS_SEARCH_INDEX_PATH=os.path.join(self.directory.name, 'index.bin'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.author = create_author()
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = create_book(self.author, 'Resurrection', tags=['classic'])
+        self.assertEqual(list(search_books('classic')), [book])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(len(search_books('resurrection')), 0)
+
+    def test_unpublished_books_leave_results_before_the_next_sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = create_book(self.author, 'Resurrection')
+        self.assertEqual(list(search_books('resurrection')), [book])
+
+        # No worker runs the queued sync.
+        with mock.patch('books.tasks.sync_search_index.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                book.status = Books.Status.DRAFT
+                book.save()
+        apply_async.assert_called_once()
+        self.assertEqual(list(search_books('resurrection')), [])
+        response = self.client.get(reverse('books:book-search'), {'q': 'resurrection'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_deleted_books_are_dropped_through_tombstones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept, deleted = create_book(self.author, 'Resurrection'), create_book(self.author, 'Hadji Murat')
+        deleted_id = deleted.id
+        with mock.patch('books.tasks.sync_search_index.apply_async'):
+            with self.captureOnCommitCallbacks(execute=True):
+                deleted.delete()
+        self.assertEqual(list(SearchIndexTombstone.objects.values_list('book_id', flat=True)), [deleted_id])
+
+        self.assertEqual(search_index.sync_index(), 1)
+        self.assertEqual(list(search_index.get_index().search('hadji')), [])
+        self.assertEqual(list(search_index.get_index().search('resurrection')), [kept.id])
+        self.assertFalse(SearchIndexTombstone.objects.exists())
+
+    def test_sync_starts_from_the_latest_snapshot_and_skips_idle_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = create_book(self.author, 'Resurrection')
+        path = search_index._snapshot_path()
+        mtime = os.stat(path).st_mtime_ns
+        synced_at = search_index._load_synced_at(search_index.InvertedIndex.load(path))
+        self.assertEqual(search_index.sync_index(), 0)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        # The idle sync still moves the next one's window forward.
+        self.assertGreater(search_index._load_synced_at(search_index.InvertedIndex.load(path)), synced_at)
+
+        # Another worker wrote a newer snapshot; this process's copy is stale.
+        stale = search_index.InvertedIndex.load(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            second = create_book(self.author, 'Hadji Murat')
+        search_index._index = stale
+        Books.objects.filter(pk=first.pk).update(title='Resurrection revised', updated_at=timezone.now())
+        search_index.sync_index()
+        restored = search_index.InvertedIndex.load(path)
+        self.assertEqual(list(restored.search('hadji')), [second.id])
+        self.assertEqual(list(restored.search('revised')), [first.id])
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        autocomplete._index = None
+
+    def test_completes_titles_authors_and_tags(self):
+        author = create_author()
+        with self.captureOnCommitCallbacks(execute=True):
+            book = create_book(author, 'Childhood', tags=['Memoir'])
+
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'chi'})
+        self.assertEqual([item['id'] for item in response.data['books']], [book.id])
+
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'tolst'})
+        self.assertEqual([item['label'] for item in response.data['authors']], ['Leo Tolstoy'])
+
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'mem'})
+        self.assertEqual([item['id'] for item in response.data['tags']], ['memoir'])
+
+    def test_common_title_prefix_leaves_room_for_authors_and_tags(self):
+        entries = [(f'the book {number}', 'books', number, f'The book {number}')
+                   for number in range(autocomplete.SCAN_LIMIT * 2)]
+        entries += [('theodor storm', 'authors', 1, 'Theodor Storm'), ('theatre', 'tags', 'theatre', 'Theatre')]
+        results = autocomplete.PrefixIndex(entries).complete('the', limit=3)
+        self.assertEqual(len(results['books']), 3)
+        self.assertEqual(results['authors'], [(1, 'Theodor Storm')])
+        self.assertEqual(results['tags'], [('theatre', 'Theatre')])
+
+    def test_catalog_changes_rebuild_in_the_background(self):
+        with mock.patch.object(autocomplete, 'catalog_entries', return_value=[('dune', 'books', 1, 'Dune')]):
+            old = autocomplete.get_index()
+        site_cache.bump('books')
+        with mock.patch.object(autocomplete, 'catalog_entries', return_value=[('emma', 'books', 2, 'Emma')]):
+            self.assertIs(autocomplete.get_index(), old)
+            rebuilding = autocomplete._rebuilding
+            if rebuilding is not None:
+                rebuilding.join()
+        self.assertEqual(autocomplete.get_index().complete('em')['books'], [(2, 'Emma')])
+
+
+class KeysetPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author()
+        cls.books = [create_book(author, f'Book {number}') for number in range(5)]
+        # Several books share a date, so the id has to break ties.
+        Books.objects.filter(id__in=[book.id for book in cls.books[:3]]).update(date=date(2000, 1, 1))
+
+    def test_api_walks_forward_and_back(self):
+        expected = list(Books.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        seen, url = [], reverse('books:book-list') + '?page_size=2'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append(response.data)
+            seen += [book['id'] for book in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([book['id'] for book in response.data['results']], expected[2:4])
+
+    def test_html_list_uses_cursor_links(self):
+        response = self.client.get(reverse('books:book_list'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_other_pages())
+
+    def test_seek_starts_the_index_scan_at_the_cursor(self):
+        paginator = KeysetPaginator(('-date', '-id'), 2)
+        page = paginator.paginate(Books.objects.filter(status=Books.Status.PUBLISHED))
+        queryset = Books.objects.filter(status=Books.Status.PUBLISHED).order_by('-date', '-id').filter(
+            paginator._seek(paginator.decode_cursor(page.next_cursor, Books)[0], paginator.ordering)
+        )
+        # The redundant leading bound is what lets the index scan start at the cursor.
+        self.assertIn('"books_books"."date" <= ', str(queryset.query))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('books:author-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_values_must_match_the_ordering_fields(self):
+        for position in ([{'a': 1}, 1], ['notadate', 'x'], [None, 1], ['2000-01-01', 'x']):
+            payload = json.dumps({'p': position, 'r': 0}).encode()
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            response = self.client.get(reverse('books:book-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+            response = self.client.get(reverse('books:book_list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class BookApiQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    # ETag aggregate + page + tags + comments (with profile and user) + subscription + purchases
+    LIST_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile()
+        commenter = create_profile('commenter')
+        authors = [create_author(f'First{number}', f'Last{number}') for number in range(3)]
+        for number in range(24):
+            book = create_book(authors[number % 3], f'Book {number}', tags=['classic', f'tag{number}'])
+            Comments.objects.create(books=book, profile=commenter, content='Nice')
+            if number % 4 == 0:
+                BookPurchase.objects.create(user=cls.profile.user, book=book)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for page_size in (5, 20):
+            response = self.assertQueryBudget(
+                self.LIST_BUDGET, self.client.get, reverse('books:book-list'),
+                {'page_size': page_size, 'expand': 'comments,can_view_pdf'}
+            )
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_can_view_pdf_uses_purchases(self):
+        response = self.client.get(reverse('books:book-list'), {'page_size': 24, 'expand': 'can_view_pdf'})
+        purchased = set(BookPurchase.objects.values_list('book_id', flat=True))
+        for book in response.data['results']:
+            self.assertEqual(book['can_view_pdf'], book['id'] in purchased)
+
+    def test_retrieve_query_budget(self):
+        book = Books.objects.first()
+        self.assertQueryBudget(self.LIST_BUDGET, self.client.get, reverse('books:book-detail', args=[book.id]))
+
+
+class BookPageQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # book (author, PDF info, viewer state) + tags + first comments + related books
+    PAGE_BUDGET = 4
+    # the session and the user, plus the profile photo in the page header
+    LOGIN_QUERIES = 3
+    # the subscription and purchases, until the viewer's entitlements are cached
+    ENTITLEMENT_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = create_book(create_author(), tags=['classic', 'novel', 'russian'])
+        cls.profile = create_profile()
+        cls.comments = [
+            Comments.objects.create(books=cls.book, profile=create_profile(f'reader{number}'), content='Nice')
+            for number in range(5)
+        ]
+        Bookmarks.objects.create(profile=cls.profile, book=cls.book)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_detail_page(self):
+        # The conditional GET takes updated_at from the book the page loads.
+        response = self.assertQueryBudget(self.PAGE_BUDGET, self.client.get,
+                                          reverse('books:book_detail', args=[self.book.id]))
+        self.assertContains(response, 'classic')
+        self.assertNotIn('comments', response.context)
+
+    def test_member_detail_page(self):
+        self.client.force_login(self.profile.user)
+        url = reverse('books:book_detail', args=[self.book.id])
+        response = self.assertQueryBudget(self.PAGE_BUDGET + self.LOGIN_QUERIES + self.ENTITLEMENT_QUERIES,
+                                          self.client.get, url)
+        self.assertContains(response, 'russian')
+        self.assertContains(response, 'reader4')
+        self.assertTrue(response.context['bookmarked'])
+        self.assertFalse(response.context['has_purchased'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookPurchase.objects.create(user=self.profile.user, book=self.book)
+        self.client.get(url)
+        response = self.assertQueryBudget(self.PAGE_BUDGET + self.LOGIN_QUERIES, self.client.get, url)
+        self.assertTrue(response.context['has_purchased'])
+        self.assertFalse(response.context['can_purchase'])
+
+    def test_comment_forms_render_the_page_within_budget(self):
+        user = self.comments[0].profile.user
+        self.client.force_login(user)
+        for url in (reverse('books:add_comment', args=[self.book.id]),
+                    reverse('books:edit_comment', args=[self.comments[0].id])):
+            cache.clear()
+            response = self.assertQueryBudget(self.PAGE_BUDGET + self.LOGIN_QUERIES + self.ENTITLEMENT_QUERIES,
+                                              self.client.post, url, {'content': ''})
+            self.assertEqual(response.context['book'], self.book)
+            self.assertTrue(response.context['form'].errors)
+
+        response = self.client.post(reverse('books:edit_comment', args=[self.comments[1].id]), {'content': ''})
+        self.assertEqual(response.status_code, 404)
+
+
+class SparseFieldsetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = create_book(create_author(), tags=['classic'])
+        Comments.objects.create(books=cls.book, profile=create_profile(), content='Nice')
+
+    def test_list_defaults_to_slim_representation(self):
+        response = self.client.get(reverse('books:book-list'))
+        self.assertEqual(
+            response.data['results'][0],
+            {'id': self.book.id, 'title': 'War and Peace', 'author_name': 'Leo Tolstoy', 'price': '10.00',
+             'tags': ['classic']},
+        )
+
+    def test_fields_and_expand(self):
+        response = self.client.get(reverse('books:book-list'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+        response = self.client.get(reverse('books:book-list'), {'expand': 'comments'})
+        self.assertEqual(len(response.data['results'][0]['comments']), 1)
+
+    def test_detail_keeps_full_representation(self):
+        response = self.client.get(reverse('books:book-detail', args=[self.book.id]))
+        self.assertIn('comments', response.data)
+        self.assertIn('description', response.data)
+
+    def test_only_loads_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('books:book-list'), {'fields': 'id,title'})
+        self.assertNotIn('description', queries.captured_queries[0]['sql'])
+
+
+class CommentFeedTests(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = create_book(create_author())
+        cls.profiles = [create_profile(f'reader{number}') for number in range(3)]
+        cls.comments = [
+            Comments.objects.create(books=cls.book, profile=cls.profiles[number % 3], content=f'Comment {number}')
+            for number in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.profiles[0].user)
+
+    def test_comment_count_follows_creates_and_deletes(self):
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.comment_count, 7)
+        self.comments[0].delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.comment_count, 6)
+
+    def test_api_walks_comments_one_query_per_page(self):
+        expected = [comment.id for comment in sorted(self.comments, key=lambda c: (c.created_at, c.id), reverse=True)]
+        seen, url = [], reverse('books:book-comments', args=[self.book.id]) + '?page_size=3'
+        while url:
+            response = self.assertQueryBudget(1, self.client.get, url)
+            seen += [comment['id'] for comment in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        self.assertIn(response.data['results'][0]['username'], {'reader0', 'reader1', 'reader2'})
+
+    def test_load_more_continues_after_detail_page(self):
+        # Comments are only on the members' page.
+        self.client.force_login(self.profiles[0].user)
+        response = self.client.get(reverse('books:book_detail', args=[self.book.id]))
+        self.assertTrue(response.context['show_all'])
+        cursor = response.context['comments'].next_cursor
+
+        response = self.client.get(reverse('books:load_more_comments', args=[self.book.id]), {'cursor': cursor})
+        self.assertEqual(len(response.json()['comments']), 3)
+        self.assertIsNotNone(response.json()['next_cursor'])
+
+        response = self.client.get(reverse('books:load_more_comments', args=[self.book.id]), {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagFacetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author()
+        cls.books = [create_book(author, f'Book {number}', tags=['classic'] + (['war'] if number % 2 else []))
+                     for number in range(8)]
+        create_book(author, 'Draft', status=Books.Status.DRAFT, tags=['war'])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_facets_count_published_books(self):
+        response = self.client.get(reverse('books:tag_facets'))
+        self.assertEqual(
+            [(facet['slug'], facet['count']) for facet in response.data],
+            [('classic', 8), ('war', 4)],
+        )
+
+    def test_facets_follow_tag_changes(self):
+        self.client.get(reverse('books:tag_facets'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].tags.add('war')
+        response = self.client.get(reverse('books:tag_facets'))
+        self.assertEqual(response.data[1]['count'], 5)
+
+    def test_tag_page_is_paginated(self):
+        response = self.client.get(reverse('books:book_list_by_tag', args=['classic']))
+        self.assertEqual(len(response.context['books']), 6)
+        self.assertTrue(response.context['page_obj'].has_next())
+
+        response = self.client.get(reverse('books:book_list_by_tag', args=['missing']))
+        self.assertEqual(len(response.context['books']), 0)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = create_book(create_author(), tags=['classic'])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_reused_until_the_book_changes(self):
+        self.client.get(reverse('books:book_list'))
+        Books.objects.filter(pk=self.book.pk).update(title='Renamed quietly')
+        self.assertContains(self.client.get(reverse('books:book_list')), 'War and Peace')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Resurrection'
+            self.book.save()
+        self.assertContains(self.client.get(reverse('books:book_list')), 'Resurrection')
+
+    def test_an_edit_only_invalidates_that_books_fragments(self):
+        other = create_book(self.book.author, 'Anna Karenina')
+        self.client.get(reverse('books:book_list'))
+        Books.objects.filter(pk=other.pk).update(title='Renamed quietly')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Resurrection'
+            self.book.save()
+        response = self.client.get(reverse('books:book_list'))
+        self.assertContains(response, 'Resurrection')
+        self.assertContains(response, 'Anna Karenina')
+
+    def test_user_specific_parts_are_not_shared(self):
+        self.client.get(reverse('books:book_detail', args=[self.book.id]))
+        self.client.force_login(create_profile().user)
+        response = self.client.get(reverse('books:book_detail', args=[self.book.id]))
+        self.assertContains(response, 'Add to Bookmarks')
+        self.assertContains(response, 'classic')
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_author()
+        cls.book = create_book(cls.author, tags=['classic'])
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, headers={'if-none-match': response['ETag'], **headers})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return response
+
+    def test_list_and_detail_answer_304_until_changed(self):
+        for url in (reverse('books:book-list'), reverse('books:book-detail', args=[self.book.id]),
+                    reverse('books:author-list')):
+            self.assertNotModified(url)
+
+        url = reverse('books:book-detail', args=[self.book.id])
+        etag = self.client.get(url)['ETag']
+        Comments.objects.create(books=self.book, profile=create_profile(), content='Nice')
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_etag_depends_on_query_and_viewer(self):
+        url = reverse('books:book-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'fields': 'id'})['ETag'], etag)
+        self.client.force_authenticate(create_profile().user)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_anonymous_html_detail_pages(self):
+        self.assertNotModified(reverse('books:book_detail', args=[self.book.id]))
+        self.assertNotModified(reverse('books:author_detail', args=[self.author.id]))
+        self.client.force_login(create_profile('member').user)
+        self.assertNotIn('ETag', self.client.get(reverse('books:book_detail', args=[self.book.id])))
+
+
+class SiteCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bumping_a_namespace_orphans_its_keys(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(site_cache.get_or_set(('books', 'tags'), 'answer', compute), 1)
+        self.assertEqual(site_cache.get_or_set(('books', 'tags'), 'answer', compute), 1)
+        site_cache.bump('authors')
+        self.assertEqual(site_cache.get_or_set(('books', 'tags'), 'answer', compute), 1)
+        site_cache.bump('tags')
+        self.assertEqual(site_cache.get_or_set(('books', 'tags'), 'answer', compute), 2)
+
+    def test_model_changes_bump_namespaces(self):
+        before = site_cache.versions(('books', 'authors', 'comments'))
+        with self.captureOnCommitCallbacks(execute=True):
+            book = create_book(create_author())
+            Comments.objects.create(books=book, profile=create_profile(), content='Nice')
+        after = site_cache.versions(('books', 'authors', 'comments'))
+        self.assertTrue(all(new > old for old, new in zip(before, after)))
+
+    def test_hit_and_miss_counters(self):
+        for _ in range(3):
+            site_cache.get_or_set('plans', 'all', list)
+        stats = site_cache.get_stats()['plans:all']
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+
+class PdfServingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        cache.clear()
+        self.book = create_book(create_author())
+        self.book.pdf_file.save('book.pdf', ContentFile(b'%PDF-' + bytes(range(256)) * 40))
+        self.profile = create_profile()
+        BookPurchase.objects.create(user=self.profile.user, book=self.book)
+        self.client.force_login(self.profile.user)
+        self.url = reverse('books:view_pdf_file', args=[self.book.id])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, headers={'range': 'bytes=5-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 5-9/{self.book.pdf_file.size}')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(5)))
+
+        response = self.client.get(self.url, headers={'range': 'bytes=-4'})
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(252, 256)))
+
+        response = self.client.get(self.url, headers={'range': 'bytes=999999-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_full_download_and_stale_if_range(self):
+        response = self.client.get(self.url, headers={'range': 'bytes=0-9', 'if-range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content)), self.book.pdf_file.size)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_requires_entitlement(self):
+        self.client.force_login(create_profile('stranger').user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(PDF_SERVE_MODE='x-accel-redirect', PDF_X_ACCEL_PREFIX='/protected-media/')
+    def test_proxy_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.book.pdf_file.name)
+        self.assertEqual(response.content, b'')
+
+        self.book.pdf_file.save('война.pdf', ContentFile(b'%PDF-'))
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/books/pdfs/%D0%B2%D0%BE%D0%B9%D0%BD%D0%B0.pdf')
+        self.assertEqual(response['Content-Disposition'],
+                         "inline; filename*=utf-8''%D0%B2%D0%BE%D0%B9%D0%BD%D0%B0.pdf")
+
+    @override_settings(PDF_SERVE_MODE='x-sendfile')
+    def test_sendfile_falls_back_to_streaming_without_a_local_path(self):
+        self.assertEqual(self.client.get(self.url)['X-Sendfile'], self.book.pdf_file.path)
+        # Storage with no filesystem path.
+        with mock.patch('books.pdf_serving._local_path', return_value=None):
+            response = self.client.get(self.url)
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(len(b''.join(response.streaming_content)), self.book.pdf_file.size)
+
+    def test_signed_url_is_served_without_queries(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.profile.user)
+        response = api_client.get(reverse('books:book-get-pdf-url', args=[self.book.id]))
+        self.assertIn('expires_at', response.data)
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get(response.data['pdf_url'], headers={'range': 'bytes=5-9'})
+            self.assertEqual(b''.join(response.streaming_content), bytes(range(5)))
+        self.assertEqual(response.status_code, 206)
+
+    def test_missing_file_is_not_found(self):
+        signed_path, _ = sign_pdf_path(self.profile.user.pk, self.book.id, self.book.pdf_file.name)
+        os.remove(self.book.pdf_file.path)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(signed_path).status_code, 404)
+
+    def test_tampered_and_expired_signed_urls_are_rejected(self):
+        path, _ = sign_pdf_path(self.profile.user.pk, self.book.id, self.book.pdf_file.name)
+        token = path.rstrip('/').rsplit('/', 1)[1]
+        tampered = reverse('books:signed_pdf', args=[token[:-1] + ('A' if token[-1] != 'A' else 'B')])
+        self.assertEqual(self.client.get(tampered).status_code, 403)
+
+        expired, _ = sign_pdf_path(self.profile.user.pk, self.book.id, self.book.pdf_file.name, max_age=-1)
+        self.assertEqual(self.client.get(expired).status_code, 403)
+
+
+def make_pdf(*pages):
+    document = pymupdf.open()
+    for text in pages:
+        document.new_page().insert_text((72, 72), text)
+    data = document.tobytes()
+    document.close()
+    return ContentFile(data)
+
+
+class PdfIngestionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.book = create_book(create_author())
+
+    def test_upload_triggers_ingestion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.pdf_file.save('book.pdf', make_pdf('Borodino field', 'Moscow burns'))
+
+        info = BookPdfInfo.objects.get(book=self.book)
+        self.assertEqual((info.status, info.page_count), (BookPdfInfo.Status.DONE, 2))
+        self.assertTrue(info.thumbnail.name.endswith('.png'))
+        self.assertEqual(list(self.book.pages.values_list('number', flat=True)), [1, 2])
+
+        response = self.client.get(reverse('books:search'), {'query': 'moscow'})
+        pages = response.context['page_results']
+        self.assertEqual([(page.book.id, page.number) for page in pages], [(self.book.id, 2)])
+        # Page text is only shown to readers who could open the PDF.
+        self.assertIsNone(pages[0].snippet)
+        self.assertNotContains(response, 'Moscow burns')
+
+        profile = create_profile()
+        self.client.force_login(profile.user)
+        response = self.client.get(reverse('books:search'), {'query': 'moscow'})
+        self.assertIsNone(response.context['page_results'][0].snippet)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookPurchase.objects.create(user=profile.user, book=self.book)
+        response = self.client.get(reverse('books:search'), {'query': 'moscow'})
+        self.assertIn('<mark>Moscow</mark>', response.context['page_results'][0].snippet)
+
+    def test_unchanged_pdf_is_not_reprocessed_and_broken_pdf_fails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.pdf_file.save('broken.pdf', ContentFile(b'not a pdf'))
+        self.assertEqual(BookPdfInfo.objects.get(book=self.book).status, BookPdfInfo.Status.FAILED)
+
+        processed_at = BookPdfInfo.objects.get(book=self.book).processed_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertEqual(BookPdfInfo.objects.get(book=self.book).processed_at, processed_at)
+
+
+class ImportCatalogTests(TestCase):
+    HEADER = 'title,author_first_name,author_last_name,author_birth_date,date,price,status,tags\n'
+
+    def write_csv(self, *rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'catalog.csv')
+        with open(path, 'w') as handle:
+            handle.write(self.HEADER + ''.join(row + '\n' for row in rows))
+        return path
+
+    def test_import_upserts_books_authors_and_tags(self):
+        path = self.write_csv(
+            'Anna Karenina,Leo,Tolstoy,1828-09-09,1878-01-01,12.50,published,"novel, russian"',
+            'War and Peace,Leo,Tolstoy,1828-09-09,1869-01-01,10.00,published,novel',
+            'Broken,Leo,Tolstoy,not a date,1869-01-01,1,published,',
+        )
+        call_command('import_catalog', path, '--batch-size', '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Author.objects.count(), 1)
+        anna = Books.objects.get(title='Anna Karenina')
+        self.assertEqual(anna.status, Books.Status.PUBLISHED)
+        self.assertEqual(sorted(anna.tags.names()), ['novel', 'russian'])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+        with open(path, 'a') as handle:
+            handle.write('Anna Karenina,Leo,Tolstoy,1828-09-09,1878-01-01,15.00,published,novel\n')
+        call_command('import_catalog', path, stdout=StringIO(), stderr=StringIO())
+        anna.refresh_from_db()
+        self.assertEqual((Books.objects.count(), str(anna.price)), (2, '15.00'))
+        self.assertEqual(list(anna.tags.names()), ['novel'])
+
+    def test_resumes_from_checkpoint(self):
+        first_row = 'War and Peace,Leo,Tolstoy,1828-09-09,1869-01-01,10.00,published,'
+        path = self.write_csv(first_row, 'Resurrection,Leo,Tolstoy,1828-09-09,1899-01-01,9.00,published,')
+        first_row_end = len(self.HEADER) + len(first_row) + 1
+        with open(path + '.checkpoint', 'w') as handle:
+            json.dump({'source': path, 'size': os.path.getsize(path), 'offset': first_row_end, 'rows': 1}, handle)
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(list(Books.objects.values_list('title', flat=True)), ['Resurrection'])
+
+
+class CatalogExportTests(APITestCase):
+    def setUp(self):
+        author = create_author()
+        self.old = create_book(author, title='Old', tags=['classic', 'novel'])
+        Books.objects.filter(pk=self.old.pk).update(updated_at='2020-01-01T00:00:00Z')
+        self.new = create_book(author, title='New')
+        create_book(author, title='Draft', status=Books.Status.DRAFT)
+        self.url = reverse('books:book-export')
+
+    def test_ndjson_since(self):
+        response = self.client.get(self.url)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['title'], row['tags']) for row in rows], [('Old', ['classic', 'novel']), ('New', [])])
+        self.assertEqual(rows[0]['author_name'], 'Leo Tolstoy')
+
+        response = self.client.get(self.url, {'since': '2021-01-01T00:00:00Z'})
+        self.assertEqual([json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()],
+                         [self.new.id])
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_gzipped_csv(self):
+        response = self.client.get(self.url, {'export_format': 'csv'}, headers={'accept-encoding': 'gzip'})
+        self.assertEqual((response['Content-Type'], response['Content-Encoding']), ('text/csv', 'gzip'))
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('id,title,'))
+        self.assertTrue(lines[1].endswith('"classic,novel"'))
+
+
+class RelatedBooksTests(APITestCase):
+    def setUp(self):
+        author = create_author()
+        self.books = [create_book(author, title=f'Book {number}') for number in range(4)]
+        self.profiles = [create_profile(f'reader{number}') for number in range(3)]
+
+    def read(self, profile, *books):
+        for book in books:
+            Bookmarks.objects.create(profile=profile, book=book)
+
+    def test_full_rebuild_and_endpoint(self):
+        first, second, third, fourth = self.books
+        self.read(self.profiles[0], first, second, third)
+        self.read(self.profiles[1], first, second)
+        BookPurchase.objects.create(user=self.profiles[2].user, book=fourth)
+        refresh_cooccurrence()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('books:book-related', args=[first.id]))
+        self.assertEqual([row['id'] for row in response.data], [second.id, third.id])
+        self.assertAlmostEqual(response.data[0]['score'], 1.0)
+        self.assertFalse(RelatedBook.objects.filter(book=fourth).exists())
+
+    def test_new_bookmark_refreshes_the_readers_books(self):
+        first, second, third, _ = self.books
+        self.read(self.profiles[0], first, second)
+        refresh_cooccurrence()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.read(self.profiles[0], third)
+        self.assertEqual(
+            set(RelatedBook.objects.filter(book=first).values_list('related_id', flat=True)), {second.id, third.id}
+        )
+        self.assertFalse(PendingRelatedRefresh.objects.exists())
+
+    def test_changes_are_applied_in_one_batch(self):
+        first, second, third, fourth = self.books
+        self.read(self.profiles[0], first)
+        self.read(self.profiles[1], first)
+        with mock.patch('books.recommendations.schedule_pending_refresh') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.read(self.profiles[0], second, third)
+                BookPurchase.objects.create(user=self.profiles[1].user, book=fourth)
+        self.assertEqual(PendingRelatedRefresh.objects.filter(kind=RelatedBook.Kind.COOCCURRENCE).count(), 5)
+        self.assertTrue(schedule.called)
+
+        with mock.patch('books.recommendations.refresh_cooccurrence', wraps=refresh_cooccurrence) as refresh:
+            refresh_pending()
+        refresh.assert_called_once()
+        self.assertFalse(PendingRelatedRefresh.objects.exists())
+        self.assertEqual(
+            set(RelatedBook.objects.filter(book=first).values_list('related_id', flat=True)),
+            {second.id, third.id, fourth.id},
+        )
+
+    def test_books_with_many_readers_wait_for_the_full_rebuild(self):
+        first, second, third, _ = self.books
+        for profile in self.profiles:
+            self.read(profile, first, second)
+        refresh_cooccurrence()
+        self.read(self.profiles[0], third)
+        with mock.patch('books.recommendations.MAX_INCREMENTAL_READERS', 2):
+            refresh_cooccurrence([third.id], [self.profiles[0].user_id])
+        self.assertNotIn(third.id, RelatedBook.objects.filter(book=first).values_list('related_id', flat=True))
+        self.assertIn(first.id, RelatedBook.objects.filter(book=third).values_list('related_id', flat=True))
+
+
+class ContentSimilarityTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            BOOKS_SIMILARITY_INDEX_PATH=os.path.join(directory.name, 'similarity.npz')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = create_author()
+
+    def similar(self, book):
+        return list(RelatedBook.objects.filter(book=book, kind=RelatedBook.Kind.CONTENT)
+                    .order_by('-score').values_list('related_id', flat=True))
+
+    def test_rebuild_and_incremental_updates(self):
+        whales = create_book(self.author, title='Whales', description='whaling ship captain ocean voyage')
+        sea = create_book(self.author, title='Sea', description='ocean voyage ship storm')
+        garden = create_book(self.author, title='Garden', description='flowers garden soil spring')
+        create_book(self.author, title='Roses', description='flowers spring roses')
+        refresh_content_similarity()
+        self.assertEqual(self.similar(whales)[0], sea.id)
+        self.assertNotIn(garden.id, self.similar(whales))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ships = create_book(self.author, title='Ships', description='ship captain storm voyage')
+        self.assertIn(ships.id, self.similar(whales))
+        self.assertIn(whales.id, self.similar(ships))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ships.status = Books.Status.DRAFT
+            ships.save()
+        self.assertNotIn(ships.id, self.similar(whales))
+        self.assertEqual(self.similar(ships), [])
+
+        response = self.client.get(reverse('books:book-related', args=[whales.id]), {'kind': 'content'})
+        self.assertEqual(response.data[0]['id'], sea.id)
+
+
+class TrendingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        author = create_author()
+        self.old, self.new, self.draft = (create_book(author, title=title) for title in ('Old', 'New', 'Draft'))
+        self.draft.status = Books.Status.DRAFT
+        self.draft.save()
+
+    def test_scores_decay(self):
+        now = timezone.now()
+        with mock.patch.object(popularity.timezone, 'now', return_value=now - popularity.HALF_LIFE * 2):
+            popularity.record(self.old.id, 'purchase')
+        popularity.record(self.new.id, 'bookmark')
+        popularity.record(self.draft.id, 'purchase')
+        with mock.patch.object(popularity.timezone, 'now', return_value=now):
+            trending = popularity.compute_trending()
+        self.assertEqual([row['id'] for row in trending], [self.new.id, self.old.id])
+        self.assertAlmostEqual(trending[1]['score'], 2, places=2)
+
+        with mock.patch.object(popularity.timezone, 'now', return_value=now + timedelta(days=365)):
+            self.assertEqual(popularity.compact(), 3)
+
+    def test_views_are_counted_in_the_cache_and_drained_in_one_update(self):
+        for book in (self.old, self.new, self.new):
+            with self.assertNumQueries(0):
+                popularity.record_view(book.id)
+        # book ids + insert of missing rows + one UPDATE for all books
+        with self.assertNumQueries(3):
+            self.assertEqual(popularity.drain_views(), 3)
+        self.assertEqual(popularity.drain_views(), 0)
+        scores = dict(popularity.BookPopularity.objects.values_list('book_id', 'score'))
+        self.assertAlmostEqual(scores[self.new.id] / scores[self.old.id], 2, places=2)
+
+        popularity.record_view(self.old.id)
+        self.assertEqual(popularity.drain_views(), 1)
+        scores = dict(popularity.BookPopularity.objects.values_list('book_id', 'score'))
+        self.assertAlmostEqual(scores[self.new.id] / scores[self.old.id], 1, places=2)
+
+    def test_scores_are_rebased_at_the_end_of_a_period(self):
+        start = popularity.EPOCH + popularity.HALF_LIFE * popularity.PERIOD_HALF_LIVES
+        with mock.patch.object(popularity.timezone, 'now', return_value=start - popularity.HALF_LIFE):
+            popularity.record(self.old.id, 'purchase')
+            popularity.record(self.new.id, 'purchase')
+        with mock.patch.object(popularity.timezone, 'now', return_value=start + popularity.HALF_LIFE):
+            # The row is still in the previous period when the new event is added.
+            popularity.record(self.new.id, 'bookmark')
+            # Reads scale the old book's row by its period without rebasing it.
+            with self.assertNumQueries(1):
+                trending = popularity.compute_trending()
+            self.assertEqual(sorted(popularity.BookPopularity.objects.values_list('period', flat=True)), [0, 1])
+            scores = {row['id']: row['score'] for row in trending}
+            self.assertAlmostEqual(scores[self.old.id], 2, places=2)
+            self.assertAlmostEqual(scores[self.new.id], 5, places=2)
+
+            popularity.compact()
+            self.assertEqual(set(popularity.BookPopularity.objects.values_list('period', flat=True)), {1})
+            self.assertEqual(popularity.compute_trending(), trending)
+
+    def test_events_and_cached_endpoint(self):
+        profile = create_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            Bookmarks.objects.create(profile=profile, book=self.old)
+            BookPurchase.objects.create(user=profile.user, book=self.new)
+        self.client.get(reverse('books:book-trending'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('books:book-trending'), {'limit': 1})
+        self.assertEqual([row['id'] for row in response.data], [self.new.id])
+
+
+
+
+class AuthorStatsTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prolific = create_author('Leo', 'Tolstoy')
+        self.recent = create_author('Anton', 'Chekhov')
+        self.idle = create_author('Ivan', 'Bunin')
+        for year in (1860, 1870, 1880):
+            create_book(self.prolific, title=f'Novel {year}', date=date(year, 1, 1))
+        self.latest = create_book(self.recent, title='Stories', date=date(1900, 1, 1))
+        create_book(self.idle, title='Unfinished', status=Books.Status.DRAFT)
+
+    def test_stats_follow_book_changes(self):
+        self.prolific.refresh_from_db()
+        self.assertEqual((self.prolific.book_count, self.prolific.last_published), (3, date(1880, 1, 1)))
+        self.idle.refresh_from_db()
+        self.assertEqual((self.idle.book_count, self.idle.last_published), (0, None))
+
+        self.latest.author = self.idle
+        self.latest.save()
+        Books.objects.get(title='Novel 1880').delete()
+        stats = dict(Author.objects.values_list('last_name', 'book_count'))
+        self.assertEqual(stats, {'Tolstoy': 2, 'Chekhov': 0, 'Bunin': 1})
+
+    def test_sorted_api_and_list_pages(self):
+        # ETag aggregate + page + each author's latest books
+        response = self.assertQueryBudget(3, self.client.get, reverse('books:author-list'), {'sort': 'books'})
+        self.assertEqual([author['last_name'] for author in response.data['results']],
+                         ['Tolstoy', 'Chekhov', 'Bunin'])
+        self.assertEqual([book['title'] for book in response.data['results'][0]['recent_books']],
+                         ['Novel 1880', 'Novel 1870', 'Novel 1860'])
+
+        response = self.client.get(reverse('books:author-list'), {'sort': 'recent', 'page_size': 1})
+        self.assertEqual([author['last_name'] for author in response.data['results']], ['Chekhov'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([author['last_name'] for author in response.data['results']], ['Tolstoy'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.assertQueryBudget(2, self.client.get, reverse('books:author_list'), {'sort': 'books'})
+        self.assertEqual(list(response.context['object_list']), [self.prolific, self.recent, self.idle])
+        self.assertContains(response, 'Novel 1870')
+
+
+class BulkBookmarksTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        author = create_author()
+        self.books = [create_book(author, title=f'Book {number}') for number in range(5)]
+        self.profile = create_profile()
+        self.client.force_authenticate(self.profile.user)
+
+    def ids(self, books):
+        return [book.id for book in books]
+
+    def bookmarked(self):
+        return set(Bookmarks.objects.filter(profile=self.profile).values_list('book_id', flat=True))
+
+    def test_bulk_add_and_remove(self):
+        Bookmarks.objects.create(profile=self.profile, book=self.books[0])
+        PendingRelatedRefresh.objects.all().delete()
+        url = reverse('books:bookmark-bulk-add')
+        with mock.patch('books.recommendations.schedule_pending_refresh') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                # profile + existing books + INSERT + queued refresh
+                response = self.assertQueryBudget(4, self.client.post, url,
+                                                  {'books': self.ids(self.books[:3]) + [999]}, format='json')
+        self.assertEqual(response.data['added'], self.ids(self.books[1:3]))
+        self.assertEqual(self.bookmarked(), set(self.ids(self.books[:3])))
+        schedule.assert_called_once_with()
+        self.assertEqual(sorted(PendingRelatedRefresh.objects.values_list('user_id', 'book_id')),
+                         [(self.profile.user_id, book_id) for book_id in self.ids(self.books[1:3])])
+        self.assertTrue(popularity.BookPopularity.objects.filter(book=self.books[1]).exists())
+
+        # profile + bookmarked books + SELECT and DELETE of the bookmarks + queued refresh
+        PendingRelatedRefresh.objects.all().delete()
+        response = self.assertQueryBudget(5, self.client.post, reverse('books:bookmark-bulk-remove'),
+                                          {'books': self.ids(self.books[1:]) + [999]}, format='json')
+        self.assertEqual(response.data['removed'], 2)
+        self.assertEqual(self.bookmarked(), {self.books[0].id})
+        self.assertEqual(sorted(PendingRelatedRefresh.objects.values_list('book_id', flat=True)),
+                         self.ids(self.books[1:3]))
+
+        response = self.client.post(url, {'books': list(range(1, 200))}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_listing_and_toggle(self):
+        self.client.post(reverse('books:bookmark-bulk-add'), {'books': self.ids(self.books)}, format='json')
+        seen, url = [], reverse('books:bookmark-list') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [bookmark['book'] for bookmark in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(seen), self.ids(self.books))
+
+        self.client.force_login(self.profile.user)
+        toggle = reverse('books:add_bookmark', args=[self.books[0].id])
+        self.client.post(toggle)
+        self.assertNotIn(self.books[0].id, self.bookmarked())
+        self.client.post(toggle)
+        self.assertIn(self.books[0].id, self.bookmarked())
+        self.assertEqual(self.client.post(reverse('books:add_bookmark', args=[999])).status_code, 404)
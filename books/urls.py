@@ -3,14 +3,15 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     HomeView, AboutUsView, post_search, BookListView, BookDetailView,
     BookListByTagView, AddBookmarkView, RemoveBookmarkView, AuthorListView,
-    AuthorDetailView, view_pdf_in_new_tab, view_pdf, AddCommentView,
+    AuthorDetailView, view_pdf_in_new_tab, view_pdf, signed_pdf, AddCommentView,
     UpdateCommentView, DeleteCommentView, load_more_comments, BookmarksView,
-    BookViewSet, AuthorViewSet
+    BookViewSet, AuthorViewSet, BookmarkViewSet, AutocompleteView, TagFacetView
 )
 
 router = DefaultRouter()
 router.register(r'api/books', BookViewSet, basename='book')
 router.register(r'api/authors', AuthorViewSet, basename='author')
+router.register(r'api/bookmarks', BookmarkViewSet, basename='bookmark')
 
 app_name = 'books'
 
@@ -25,7 +26,8 @@ urlpatterns = [
     path('authors/', AuthorListView.as_view(), name='author_list'),
     path('authors/<int:pk>/', AuthorDetailView.as_view(), name='author_detail'),
     path('view_pdf_in_new_tab/<int:book_id>/', view_pdf_in_new_tab, name='view_pdf_in_new_tab'),
-    # path('view_pdf_file/<int:book_id>/', view_pdf, name='view_pdf_file'),
+    path('view_pdf_file/<int:book_id>/', view_pdf, name='view_pdf_file'),
+    path('pdf/<str:token>/', signed_pdf, name='signed_pdf'),
     path('books/<int:book_id>/comment/add/', AddCommentView.as_view(), name='add_comment'),
     path('comment/edit/<int:comment_id>/', UpdateCommentView.as_view(), name='edit_comment'),
     path('comment/delete/<int:comment_id>/', DeleteCommentView.as_view(), name='delete_comment'),
@@ -36,5 +38,7 @@ urlpatterns = [
     path('about-us/', AboutUsView.as_view(), name='about_us'),
 
     # DRF views
+    path('api/autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('api/tags/', TagFacetView.as_view(), name='tag_facets'),
     path('', include(router.urls)),
 ]
@@ -1,29 +1,70 @@
+import re
 import stripe
+from datetime import datetime, timezone as dt_timezone
+from django.core.exceptions import PermissionDenied
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView, FormView
-from accounts.models import Profile
 from rest_framework import viewsets, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .serializers import BookSerializer, AuthorSerializer, CommentsSerializer, BookmarksSerializer
+from .serializers import (
+    BookSerializer, AuthorStatsSerializer, CommentsSerializer, CommentFeedSerializer, BookmarksSerializer,
+    BulkBookmarksSerializer, RelatedBookSerializer
+)
 from .permissions import IsOwnerOrReadOnly, IsSubscribedOrPurchased
 from rest_framework.decorators import action
-from .models import Books, Author, Bookmarks, Comments
-from subscriptions.models import BookPurchase, Subscription
+from .models import Books, Author, Bookmarks, Comments, RelatedBook
+from subscriptions.entitlements import get_entitlements
 from .forms import SearchForm, CommentsForm
+from .pagination import (
+    SearchPagination, BookCursorPagination, AuthorCursorPagination, CommentCursorPagination,
+    BookmarkCursorPagination, KeysetPaginationMixin, KeysetPaginator, InvalidCursor, AUTHOR_ORDERINGS
+)
+from .search import search_books, search_authors, search_pages
+from .autocomplete import complete
+from .bookmarks import add_bookmarks, remove_bookmarks, toggle_bookmark
+from .facets import get_tag_facets, resolve_tag
+from .conditional import ConditionalGetMixin, ConditionalDetailMixin
+from .pdf_serving import serve_file, sign_pdf_path, verify_pdf_token, InvalidPdfToken
+from .popularity import get_trending, record_view, TRENDING_SIZE
+from .recommendations import related_books, related_books_by_kind
+from .export import EXPORT_FORMATS, IgnoreClientContentNegotiation, export_queryset, export_stream
 from django.urls import reverse
-from django.http import FileResponse, Http404, JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 import requests
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.text import compress_sequence
+from librarysite import cache as site_cache
+from librarysite.throttling import ThrottleMixin
 from django.core.paginator import Paginator
+from django.db.models import Exists, F, Max, OuterRef, Prefetch
+
+
+SEARCH_RESULTS_PER_PAGE = 9
+SEARCH_AUTHORS_LIMIT = 6
+SEARCH_PAGES_LIMIT = 10
+COMMENTS_PER_PAGE = 3
+RELATED_BOOKS_LIMIT = 6
+AUTHOR_BOOKS_PREVIEW = 3
+AUTHOR_PAGE_BOOKS = 50
+HOME_TRENDING_LIMIT = 5
+RELATED_KINDS = {'readers': RelatedBook.Kind.COOCCURRENCE, 'content': RelatedBook.Kind.CONTENT}
+GZIP_RE = re.compile(r'\bgzip\b')
 
 
 class HomeView(TemplateView):
     template_name = 'books/home.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['trending'] = get_trending(HOME_TRENDING_LIMIT)
+        return context
+
 
 class AboutUsView(TemplateView):
     template_name = 'books/about_us.html'
@@ -32,239 +73,446 @@ class AboutUsView(TemplateView):
 def post_search(request):
     form = SearchForm()
     query = None
-    book_results, author_results = [], []
+    book_results, author_results, page_results = [], [], []
 
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
             query = form.cleaned_data['query']
-            book_results = Books.objects.filter(
-                status=Books.Status.PUBLISHED,
-                title__icontains=query
-            ).distinct()
-            author_results = Author.objects.filter(
-                Q(first_name__icontains=query) | Q(last_name__icontains=query)
-            ).distinct()
+            paginator = Paginator(search_books(query), SEARCH_RESULTS_PER_PAGE)
+            book_results = paginator.get_page(request.GET.get('page'))
+            author_results = search_authors(query)[:SEARCH_AUTHORS_LIMIT]
+            page_results = search_pages(query, SEARCH_PAGES_LIMIT, get_entitlements(request.user))
 
     return render(request, 'search.html', {
         'form': form,
         'query': query,
         'author_results': author_results,
-        'book_results': book_results
+        'book_results': book_results,
+        'page_results': page_results,
     })
 
 
-class BookListView(ListView):
+class AutocompleteView(APIView):
+    permission_classes = [AllowAny]
+    default_limit = 5
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        return Response(complete(query, max(limit, 1)), status=status.HTTP_200_OK)
+
+
+class TagFacetView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response([
+            dict(facet, url=reverse('books:book_list_by_tag', args=[facet['slug']]))
+            for facet in get_tag_facets()
+        ], status=status.HTTP_200_OK)
+
+
+class BookListView(KeysetPaginationMixin, ListView):
     model = Books
     template_name = 'books/book_list.html'
     context_object_name = 'books'
     paginate_by = 6
+    keyset_ordering = ('-date', '-id')
 
     def get_queryset(self):
-        return Books.objects.filter(status='PB')
+        return Books.objects.filter(status='PB').select_related('author')
 
 
-class BookListByTagView(ListView):
+class BookListByTagView(KeysetPaginationMixin, ListView):
     model = Books
     template_name = 'books/book_list.html'
     context_object_name = 'books'
+    paginate_by = 6
+    keyset_ordering = ('-date', '-id')
 
     def get_queryset(self):
-        tag_slug = self.kwargs.get('tag_slug')
-        return Books.objects.filter(tags__slug=tag_slug, status='PB').prefetch_related('tags')
+        self.tag = resolve_tag(self.kwargs.get('tag_slug'))
+        if self.tag is None:
+            return Books.objects.none()
+        return Books.objects.filter(tagged_items__tag_id=self.tag['id'], status='PB').select_related('author')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tag'] = self.tag
+        return context
 
 
 class AddBookmarkView(LoginRequiredMixin, View):
     def post(self, request, pk):
-        book = get_object_or_404(Books, id=pk)
-        profile = get_object_or_404(Profile, user=request.user)
-
-        bookmark, created = Bookmarks.objects.get_or_create(profile=profile, book=book)
-        if not created:
-            bookmark.delete()
-
+        try:
+            toggle_bookmark(request.user.profile, pk)
+        except Books.DoesNotExist:
+            raise Http404('No book matches the given query.')
         return redirect('books:book_detail', pk=pk)
 
 
 class RemoveBookmarkView(LoginRequiredMixin, View):
     def post(self, request, pk):
-        book = get_object_or_404(Books, id=pk)
-        profile = get_object_or_404(Profile, user=request.user)
-
-        bookmark = get_object_or_404(Bookmarks, profile=profile, book=book)
-        bookmark.delete()
+        if not remove_bookmarks(request.user.profile, [pk]):
+            raise Http404('No bookmark matches the given query.')
         return redirect('books:book_detail', pk=pk)
 
 
-class AuthorListView(ListView):
+def published_books_prefetch(limit):
+    # A window function limits each author's books, so a page of authors costs one query.
+    return Prefetch('books', to_attr='published_books', queryset=Books.objects.filter(
+        status=Books.Status.PUBLISHED
+    ).only('id', 'author_id', 'title', 'date').order_by('-date', '-id')[:limit])
+
+
+def sorted_authors(queryset, sort):
+    if sort == 'recent':
+        # Keyset pagination can't seek past NULLs; authors with no published books have no recency.
+        queryset = queryset.filter(last_published__isnull=False)
+    return queryset
+
+
+class AuthorListView(KeysetPaginationMixin, ListView):
     model = Author
     template_name = 'books/author_list.html'
     paginate_by = 6
 
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in AUTHOR_ORDERINGS else 'name'
 
-class AuthorDetailView(DetailView):
-    model = Author
-    template_name = 'books/author_detail.html'
-
+    def get_keyset_ordering(self):
+        return AUTHOR_ORDERINGS[self.get_sort()]
 
-class BookDetailView(DetailView):
-    model = Books
-    template_name = 'books/book_detail.html'
+    def get_queryset(self):
+        return sorted_authors(Author.objects.prefetch_related(published_books_prefetch(AUTHOR_BOOKS_PREVIEW)),
+                              self.get_sort())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['book'] = self.get_object()
-        context['form'] = CommentsForm()
-        comments = context['book'].comments.all()
-        context['comments'] = comments[:3]
-        context['all_comments'] = comments
-        context['show_all'] = len(comments) > 3
+        context['sort'] = self.get_sort()
+        context['sorts'] = AUTHOR_ORDERINGS
+        return context
+
+
+class AuthorDetailView(ConditionalDetailMixin, DetailView):
+    model = Author
+    template_name = 'books/author_detail.html'
+
+    def get_queryset(self):
+        return Author.objects.prefetch_related(published_books_prefetch(AUTHOR_PAGE_BOOKS))
+
+    def get_last_modified(self):
+        # The page lists the author's books, so their changes count too.
+        stats = Author.objects.filter(pk=self.kwargs['pk']).aggregate(
+            author=Max('updated_at'), books=Max('books__updated_at')
+        )
+        if stats['author'] is None:
+            return None
+        return max(stats['author'], stats['books'] or stats['author'])
+
+
+class BookPageMixin:
+    """
+    The book page in a fixed number of queries: the book with its author, PDF
+    info and whether the viewer bookmarked it, its tags, the first comments
+    (cached) and the related books. Purchases and the subscription come from
+    the viewer's cached entitlements.
+    """
+
+    def get_book_queryset(self):
+        books = Books.objects.select_related('author', 'pdf_info').prefetch_related('tags')
+        user = self.request.user
+        if user.is_authenticated:
+            books = books.annotate(
+                bookmarked=Exists(Bookmarks.objects.filter(book=OuterRef('pk'), profile__user=user)),
+            )
+        return books
+
+    def get_book_context(self, book):
+        context = {'book': book, 'show_all': book.comment_count > COMMENTS_PER_PAGE}
+        related = related_books_by_kind(book.id, limit=RELATED_BOOKS_LIMIT)
+        context['related_books'] = related.get(RelatedBook.Kind.COOCCURRENCE, [])
+        context['similar_books'] = related.get(RelatedBook.Kind.CONTENT, [])
 
         if self.request.user.is_authenticated:
-            purchased_books = BookPurchase.objects.filter(user=self.request.user).values_list('book_id', flat=True)
-            subscription = Subscription.objects.filter(user=self.request.user, end_date__gt=timezone.now()).exists()
-            context['has_active_subscription'] = subscription
-            context['purchased_books'] = purchased_books
-            context['has_purchased'] = context['book'].id in purchased_books
-            context['can_purchase'] = context['book'].id not in purchased_books
-            context['bookmarked'] = Bookmarks.objects.filter(profile=self.request.user.profile,
-                                                             book=context['book']).exists()
+            # Only members see comments.
+            context['comments'] = first_comments_page(book.id)
+            entitlements = get_entitlements(self.request.user)
+            context['has_active_subscription'] = entitlements.has_active_subscription
+            context['has_purchased'] = entitlements.has_purchased(book.id)
+            context['can_purchase'] = not context['has_purchased']
+            context['bookmarked'] = book.bookmarked
         else:
-            context['purchased_books'] = []
             context['has_active_subscription'] = False
             context['can_purchase'] = False
             context['has_purchased'] = False
             context['bookmarked'] = False
+        return context
+
+    def add_comment(self, book_id, form):
+        comment = form.save(commit=False)
+        comment.books_id = book_id
+        comment.profile = self.request.user.profile
+        comment.save()
+        return comment
+
+
+class BookDetailView(ThrottleMixin, BookPageMixin, ConditionalDetailMixin, DetailView):
+    model = Books
+    template_name = 'books/book_detail.html'
+    throttle_scope = 'comment'
+
+    def get_queryset(self):
+        return self.get_book_queryset()
+
+    def get_etag_variant(self):
+        # The related books block changes without the book's updated_at.
+        return site_cache.versions('related')
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record_view(self.kwargs['pk'])
+        return response
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.get_book_context(self.object))
+        context['form'] = CommentsForm()
         return context
 
     def post(self, request, *args, **kwargs):
-        book = self.get_object()
+        book = get_object_or_404(Books.objects.only('id'), pk=self.kwargs['pk'])
         form = CommentsForm(request.POST)
         if form.is_valid():
-            comment = form.save(commit=False)
-            comment.books = book
-            comment.profile = request.user.profile
-            comment.save()
-            return redirect(self.get_object())
+            self.add_comment(book.id, form)
+            return redirect('books:book_detail', pk=book.id)
 
         return self.get(request, *args, **kwargs)
 
 
-class AddCommentView(LoginRequiredMixin, FormView):
+class AddCommentView(LoginRequiredMixin, ThrottleMixin, BookPageMixin, FormView):
     form_class = CommentsForm
     template_name = 'books/book_detail.html'
+    throttle_scope = 'comment'
 
     def form_valid(self, form):
-        book = get_object_or_404(Books, id=self.kwargs['book_id'])
-        comment = form.save(commit=False)
-        comment.books = book
-        comment.profile = self.request.user.profile
-        comment.save()
+        book = get_object_or_404(Books.objects.only('id'), id=self.kwargs['book_id'])
+        self.add_comment(book.id, form)
         return redirect('books:book_detail', pk=book.id)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['book'] = get_object_or_404(Books, id=self.kwargs['book_id'])
-        context['comments'] = context['book'].comments.all()[:3]
-        context['show_all'] = context['book'].comments.count() > 3
+        context.update(self.get_book_context(get_object_or_404(self.get_book_queryset(), id=self.kwargs['book_id'])))
         return context
 
 
 class DeleteCommentView(LoginRequiredMixin, View):
     def post(self, request, comment_id):
-        comment = get_object_or_404(Comments, id=comment_id, profile=request.user.profile)
-        book_id = comment.books.id
+        comment = get_object_or_404(Comments, id=comment_id, profile__user=request.user)
+        book_id = comment.books_id
         comment.delete()
         return redirect('books:book_detail', pk=book_id)
 
 
-class UpdateCommentView(LoginRequiredMixin, FormView):
+class UpdateCommentView(LoginRequiredMixin, ThrottleMixin, BookPageMixin, FormView):
     form_class = CommentsForm
     template_name = 'books/book_detail.html'
+    throttle_scope = 'comment'
 
     def form_valid(self, form):
-        comment = get_object_or_404(Comments, id=self.kwargs['comment_id'], profile=self.request.user.profile)
+        comment = get_object_or_404(Comments, id=self.kwargs['comment_id'], profile__user=self.request.user)
         comment.content = form.cleaned_data['content']
         comment.save()
-        return redirect('books:book_detail', pk=comment.books.id)
+        return redirect('books:book_detail', pk=comment.books_id)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['book'] = get_object_or_404(Books, id=self.kwargs['book_id'])
-        context['comments'] = context['book'].comments.all()[:3]
-        context['show_all'] = context['book'].comments.count() > 3
-        context['editing_comment'] = get_object_or_404(Comments, id=self.kwargs['comment_id'],
-                                                       profile=self.request.user.profile)
+        # The book is found through the comment, which also checks that it is the viewer's.
+        context.update(self.get_book_context(get_object_or_404(
+            self.get_book_queryset(), comments__id=self.kwargs['comment_id'], comments__profile__user=self.request.user
+        )))
         return context
 
 
 def view_pdf(request, book_id):
-    book = get_object_or_404(Books, id=book_id)
-    if book.pdf_file:
-        response = FileResponse(book.pdf_file.open(), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{book.pdf_file.name}"'
-        return response
-    raise Http404("PDF file not found")
+    book = get_object_or_404(Books.objects.only('id', 'pdf_file'), id=book_id)
+    if not book.pdf_file:
+        raise Http404("PDF file not found")
+    if not get_entitlements(request.user).can_view(book.id):
+        raise PermissionDenied
+    return serve_file(request, book.pdf_file)
 
 
 def view_pdf_in_new_tab(request, book_id):
     book = get_object_or_404(Books, id=book_id)
     if not book.pdf_file:
         return HttpResponse('PDF not available', status=404)
-    return render(request, 'books/view_pdf.html', {'book': book})
+    if not get_entitlements(request.user).can_view(book.id):
+        raise PermissionDenied
+    pdf_url, _ = sign_pdf_path(request.user.pk, book.id, book.pdf_file.name)
+    return render(request, 'books/view_pdf.html', {'book': book, 'pdf_url': pdf_url})
+
+
+def signed_pdf(request, token):
+    # Every request of a PDF viewer (including each Range request) lands here,
+    # so access is decided from the token alone, without touching the database.
+    try:
+        payload = verify_pdf_token(token)
+    except InvalidPdfToken as exc:
+        return HttpResponse(str(exc), status=403)
+    pdf_field = Books._meta.get_field('pdf_file')
+    return serve_file(request, pdf_field.attr_class(None, pdf_field, payload['f']))
+
+
+def comment_feed_queryset(book_id):
+    return Comments.objects.filter(books_id=book_id).annotate(
+        username=F('profile__user__username'),
+        user_id=F('profile__user_id'),
+    ).only('id', 'content', 'created_at', 'updated_at')
+
+
+def first_comments_page(book_id):
+    return site_cache.get_or_set('comments', ('first_page', book_id), lambda: KeysetPaginator(
+        CommentCursorPagination.ordering, COMMENTS_PER_PAGE
+    ).paginate(comment_feed_queryset(book_id)))
 
 
 def load_more_comments(request, book_id):
-    if request.is_ajax():
-        book = get_object_or_404(Books, id=book_id)
-        comments = book.comments.all()
-        paginator = Paginator(comments, 3)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(CommentCursorPagination.ordering, COMMENTS_PER_PAGE)
+    try:
+        page = paginator.paginate(comment_feed_queryset(book_id), request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
 
-        comments_data = [{
-            'username': comment.profile.user.username,
-            'content': comment.content,
-            'created_at': comment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_modified': comment.is_modified,
-        } for comment in page_obj]
+    comments_data = [{
+        'username': comment.username,
+        'content': comment.content,
+        'created_at': comment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'is_modified': comment.is_modified,
+    } for comment in page]
 
-        return JsonResponse({'comments': comments_data})
-    return JsonResponse({'comments': []})
+    return JsonResponse({'comments': comments_data, 'next_cursor': page.next_cursor})
 
 
-class BookmarksView(LoginRequiredMixin, ListView):
+class BookmarksView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Bookmarks
     template_name = 'books/bookmarks.html'
     context_object_name = 'bookmarks'
+    paginate_by = 12
+    keyset_ordering = BookmarkCursorPagination.ordering
+
+    def get_queryset(self):
+        return Bookmarks.objects.filter(profile__user=self.request.user).select_related('book__author')
+
+
+class BookmarkViewSet(viewsets.GenericViewSet):
+    """
+    The viewer's bookmarks, newest first, plus bulk changes:
+    ``POST bulk-add`` and ``POST bulk-remove`` with ``{"books": [ids]}``.
+    """
+    serializer_class = BookmarksSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = BookmarkCursorPagination
 
     def get_queryset(self):
-        profile = self.request.user.profile
-        return Bookmarks.objects.filter(profile=profile).select_related('book')
+        return Bookmarks.objects.filter(profile__user=self.request.user)
+
+    def list(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def get_book_ids(self, request):
+        serializer = BulkBookmarksSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['books']
+
+    @action(detail=False, methods=['post'], url_path='bulk-add')
+    def bulk_add(self, request):
+        added = add_bookmarks(request.user.profile, self.get_book_ids(request))
+        return Response({'added': added}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='bulk-remove')
+    def bulk_remove(self, request):
+        removed = remove_bookmarks(request.user.profile, self.get_book_ids(request))
+        return Response({'removed': removed}, status=status.HTTP_200_OK)
 
-class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
-    serializer_class = AuthorSerializer
+
+class AuthorViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = AuthorStatsSerializer
     permission_classes = [AllowAny]
+    pagination_class = AuthorCursorPagination
     queryset = Author.objects.all()
 
-
-class BookViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        serializer = self.get_serializer(many=self.action == 'list')
+        queryset = super().get_queryset()
+        ordering = ()
+        if self.action == 'list':
+            ordering = self.paginator.get_ordering(self.request)
+            queryset = sorted_authors(queryset, self.request.query_params.get('sort'))
+        fields = serializer.child.fields if self.action == 'list' else serializer.fields
+        if 'recent_books' in fields:
+            queryset = queryset.prefetch_related(published_books_prefetch(AUTHOR_BOOKS_PREVIEW))
+        return self.get_serializer_class().setup_eager_loading(
+            queryset, serializer, extra_fields=[field.lstrip('-') for field in ordering]
+        )
+
+
+class BookViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Books.objects.all()
     serializer_class = BookSerializer
     permission_classes = [AllowAny]
+    pagination_class = BookCursorPagination
+    eager_loading_actions = ('list', 'retrieve', 'search')
+    # Set per action, see librarysite.throttling.
+    throttle_scope = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.eager_loading_actions:
+            serializer = self.get_serializer(many=self.action != 'retrieve')
+            ordering = getattr(self.paginator, 'ordering', ())
+            queryset = self.get_serializer_class().setup_eager_loading(
+                queryset, serializer, extra_fields=[field.lstrip('-') for field in ordering]
+            )
+        return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
 
+    def get_etag_variant(self):
+        variant = super().get_etag_variant()
+        if not self.request.user.is_authenticated:
+            return variant
+        # can_view_pdf depends on who is asking.
+        entitlements = get_entitlements(self.request.user)
+        return (*variant, self.request.user.pk, entitlements.subscription_expires_at,
+                entitlements.book_ids.tobytes().hex())
+
+    @action(detail=False, methods=['get'], url_path='search', pagination_class=SearchPagination)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        page = self.paginate_queryset(search_books(query, queryset=self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='purchase')
     def purchase_book(self, request, pk=None):
         book = self.get_object()
         user = request.user
-        if BookPurchase.objects.filter(user=user, book=book).exists():
+        if get_entitlements(user).has_purchased(book.id):
             return Response(
                 {"message": "You already own this book."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -305,17 +553,77 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'], url_path='trending')
+    def trending(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', TRENDING_SIZE)), TRENDING_SIZE)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_trending(max(limit, 0)))
+
+    @action(detail=True, methods=['get'], url_path='related')
+    def related(self, request, pk=None):
+        # Reads the precomputed neighbours only; an unknown book just has none.
+        kind = RELATED_KINDS.get(request.query_params.get('kind', 'readers'))
+        if kind is None:
+            return Response({"error": f"kind must be one of: {', '.join(RELATED_KINDS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            book_id = int(pk)
+        except ValueError:
+            raise Http404
+        return Response(RelatedBookSerializer(related_books(book_id, kind), many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='export',
+            content_negotiation_class=IgnoreClientContentNegotiation)
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": f"export_format must be one of: {', '.join(EXPORT_FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({"error": "since must be an ISO 8601 datetime."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, dt_timezone.utc)
+
+        content = export_stream(export_queryset(since or None), export_format)
+        response = StreamingHttpResponse(content_type=EXPORT_FORMATS[export_format])
+        if GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            content = compress_sequence(content)
+            response['Content-Encoding'] = 'gzip'
+        response.streaming_content = content
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsSubscribedOrPurchased],
             url_path='pdf-url')
     def get_pdf_url(self, request, pk=None):
         book = self.get_object()
         if book.pdf_file:
-            pdf_url = request.build_absolute_uri(reverse('books:view_pdf_in_new_tab', args=[book.id]))
-            return Response({'pdf_url': pdf_url}, status=status.HTTP_200_OK)
+            path, expires_at = sign_pdf_path(request.user.pk, book.id, book.pdf_file.name)
+            return Response({
+                'pdf_url': request.build_absolute_uri(path),
+                'expires_at': datetime.fromtimestamp(expires_at, tz=dt_timezone.utc),
+                'viewer_url': request.build_absolute_uri(reverse('books:view_pdf_in_new_tab', args=[book.id])),
+            }, status=status.HTTP_200_OK)
         else:
             return Response({"error": "PDF file doesn't exist."}, status=status.HTTP_404_NOT_FOUND)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='comments/add')
+    @action(detail=True, methods=['get'], url_path='comments', pagination_class=CommentCursorPagination)
+    def comments(self, request, pk=None):
+        page = self.paginate_queryset(comment_feed_queryset(pk))
+        serializer = CommentFeedSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='comments/add',
+            throttle_scope='comment')
     def add_comment(self, request, pk=None):
         book = self.get_object()
         content = request.data.get('content', '')
@@ -0,0 +1,152 @@
+"""
+Site-wide cache helpers.
+
+Keys live in namespaces, one per model family ('books', 'authors', ...).
+Each namespace has a version counter in the shared cache and every key embeds
+the versions it depends on, so invalidating a namespace is a single ``incr``:
+keys built on the old version are simply never read again and expire.
+"""
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'cache:version:{}'
+STATS_KEY = 'cache:stats:{}'
+STATS_LABELS_KEY = 'cache:stats:labels'
+STATS_FIELDS = ('hits', 'misses', 'hit_us', 'miss_us')
+STATS_FLUSH_EVERY = 50
+
+_missing = object()
+
+
+def _names(namespaces):
+    return (namespaces,) if isinstance(namespaces, str) else tuple(namespaces)
+
+
+def _parts(key):
+    return (key,) if isinstance(key, (str, int)) else tuple(key)
+
+
+def versions(namespaces):
+    keys = [VERSION_KEY.format(name) for name in _names(namespaces)]
+    found = cache.get_many(keys)
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def version_tag(namespaces):
+    return '.'.join(str(version) for version in versions(namespaces))
+
+
+def bump(*namespaces):
+    for name in namespaces:
+        key = VERSION_KEY.format(name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def bump_on_commit(*namespaces):
+    transaction.on_commit(lambda: bump(*namespaces))
+
+
+def make_key(namespaces, key):
+    names = _names(namespaces)
+    return ':'.join(['-'.join(names), version_tag(names), *(str(part) for part in _parts(key))])
+
+
+def _label(namespaces, key):
+    return f"{'-'.join(_names(namespaces))}:{_parts(key)[0]}"
+
+
+def get(namespaces, key, default=None):
+    started = time.perf_counter()
+    value = cache.get(make_key(namespaces, key), _missing)
+    record(_label(namespaces, key), value is not _missing, time.perf_counter() - started)
+    return default if value is _missing else value
+
+
+def set(namespaces, key, value, timeout=None):
+    cache.set(make_key(namespaces, key), value, timeout)
+
+
+def get_or_set(namespaces, key, default, timeout=None):
+    """
+    Return the cached value, computing it with ``default()`` on a miss. Miss
+    latency includes the computation, which is what a hit saves.
+    """
+    started = time.perf_counter()
+    cache_key = make_key(namespaces, key)
+    value = cache.get(cache_key, _missing)
+    hit = value is not _missing
+    if not hit:
+        value = default()
+        cache.set(cache_key, value, timeout)
+    record(_label(namespaces, key), hit, time.perf_counter() - started)
+    return value
+
+
+# Counters are kept per process and pushed to the shared cache in batches,
+# so collecting them costs a few ``incr`` calls every STATS_FLUSH_EVERY lookups.
+_stats_lock = threading.Lock()
+_stats = {}
+_pending = 0
+
+
+def record(label, hit, elapsed):
+    global _pending
+    with _stats_lock:
+        counters = _stats.setdefault(label, dict.fromkeys(STATS_FIELDS, 0))
+        counters['hits' if hit else 'misses'] += 1
+        counters['hit_us' if hit else 'miss_us'] += int(elapsed * 1_000_000)
+        _pending += 1
+        flush = _pending >= STATS_FLUSH_EVERY
+    if flush:
+        flush_stats()
+
+
+def flush_stats():
+    global _stats, _pending
+    with _stats_lock:
+        pending, _stats, _pending = _stats, {}, 0
+    if not pending:
+        return
+
+    labels = cache.get(STATS_LABELS_KEY, ())
+    if any(label not in labels for label in pending):
+        cache.set(STATS_LABELS_KEY, tuple(sorted({*labels, *pending})), timeout=None)
+    for label, counters in pending.items():
+        for field, amount in counters.items():
+            if not amount:
+                continue
+            key = STATS_KEY.format(f'{label}:{field}')
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                cache.set(key, amount, timeout=None)
+
+
+def get_stats():
+    flush_stats()
+    labels = cache.get(STATS_LABELS_KEY, ())
+    keys = {
+        (label, field): STATS_KEY.format(f'{label}:{field}')
+        for label in labels for field in STATS_FIELDS
+    }
+    values = cache.get_many(keys.values())
+    stats = {}
+    for (label, field), key in keys.items():
+        stats.setdefault(label, {})[field] = values.get(key, 0)
+    return stats
+
+
+def reset_stats():
+    global _stats, _pending
+    with _stats_lock:
+        _stats, _pending = {}, 0
+    labels = cache.get(STATS_LABELS_KEY, ())
+    cache.delete_many([STATS_KEY.format(f'{label}:{field}') for label in labels for field in STATS_FIELDS])
+    cache.delete(STATS_LABELS_KEY)
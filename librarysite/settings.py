@@ -1,6 +1,7 @@
 from datetime import timedelta
 from pathlib import Path
 import os
+import sys
 import environ
 from decouple import config
 
@@ -21,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'books.apps.BooksConfig',
     'accounts.apps.AccountsConfig',
     'subscriptions.apps.SubscriptionsConfig',
@@ -58,6 +60,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'books.context_processors.fragment_cache',
             ],
         },
     },
@@ -76,6 +79,26 @@ DATABASES = {
     }
 }
 
+CACHE_URL = env('CACHE_URL', default='')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'librarysite',
+            'TIMEOUT': 60 * 15,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'librarysite',
+            'TIMEOUT': 60 * 15,
+        }
+    }
+
 AUTH_USER_MODEL = 'accounts.MyUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -135,16 +158,41 @@ CELERY_RESULT_BACKEND = "django-db"
 CELERY_BROKER_URL = config('redis://localhost:6380', default='redis://localhost:6379')
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers.DatabaseScheduler'
+# The test suite runs tasks in-process, so it needs no broker.
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=sys.argv[1:2] == ['test'])
+
+# 'django' streams PDFs itself; 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd)
+# let the front proxy send the file once Django has checked access.
+PDF_SERVE_MODE = env('PDF_SERVE_MODE', default='django')
+PDF_X_ACCEL_PREFIX = env('PDF_X_ACCEL_PREFIX', default='/protected-media/')
+# Lifetime in seconds of the signed PDF links handed out by the API and the PDF viewer.
+PDF_URL_MAX_AGE = env.int('PDF_URL_MAX_AGE', default=15 * 60)
+
+BOOKS_SEARCH_BACKEND = env('BOOKS_SEARCH_BACKEND', default='database')
+BOOKS_SEARCH_INDEX_PATH = env('BOOKS_SEARCH_INDEX_PATH', default=os.path.join(BASE_DIR, 'var', 'search_index.bin'))
+BOOKS_SIMILARITY_INDEX_PATH = env('BOOKS_SIMILARITY_INDEX_PATH',
+                                  default=os.path.join(BASE_DIR, 'var', 'similarity_index.npz'))
 
 PROTOCOL = 'http'
 DOMAIN = '127.0.0.1:8000'
 RESET_URL = '/accounts/reset/'
 
+# Resolves a username or an email with one query; it also provides ModelBackend's permissions.
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
     'accounts.auth_backends.EmailAuthBackend',
 ]
 
+# New and rehashed passwords use the first hasher; the others only verify old hashes.
+# 600,000 PBKDF2-SHA256 rounds is the OWASP minimum (Django 5.1 defaults to 870,000).
+PASSWORD_PBKDF2_ITERATIONS = env.int('PASSWORD_PBKDF2_ITERATIONS', default=600_000)
+PASSWORD_HASHERS = [
+    'accounts.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -152,6 +200,20 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'librarysite.throttling.ScopeThrottle',
+    ),
+}
+
+# Limits per throttle_scope and identity ('ip', 'user', 'email'), counted in the shared cache.
+THROTTLE_ENABLED = env.bool('THROTTLE_ENABLED', default=True)
+THROTTLE_NUM_PROXIES = env.int('THROTTLE_NUM_PROXIES', default=0)
+THROTTLE_RATES = {
+    'login': {'ip': '30/min', 'email': '5/min'},
+    'register': {'ip': '10/hour'},
+    'password_reset': {'ip': '10/hour', 'email': '3/hour'},
+    'password_change': {'user': '5/min'},
+    'comment': {'user': '10/min'},
 }
 
 SIMPLE_JWT = {
@@ -0,0 +1,184 @@
+"""
+Rate limiting for expensive endpoints (password hashing, outgoing mail).
+
+A view names a scope (``throttle_scope = 'login'``) and THROTTLE_RATES maps
+each scope to limits per identity kind, e.g. ``{'ip': '20/min', 'email':
+'5/min'}``. Kinds are 'ip', 'user' (the client IP for anonymous requests)
+and 'email' (the submitted email or username).
+
+Counting is a sliding window approximated from two fixed windows: the
+estimate is the current window's count plus the previous window's count
+weighted by how much of it still overlaps the sliding window. Counters live
+in the shared cache and are bumped with ``incr``, which is atomic on Redis,
+so every worker sees the same counts at the cost of two cache calls per
+limit.
+"""
+import hashlib
+import math
+import time
+from collections.abc import Mapping
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.throttling import BaseThrottle
+
+COUNT_KEY = 'throttle:{}:{}:{}:{}'
+REJECTED_KEY = 'throttle:rejected:{}'
+REJECTED_LABELS_KEY = 'throttle:rejected:labels'
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+EMAIL_FIELDS = ('email', 'username_or_email', 'username')
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60)."""
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), PERIODS[period.strip().lower()]
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid throttle rate {rate!r}.')
+
+
+def client_ip(request):
+    # With NUM_PROXIES trusted proxies in front, the client is the last
+    # address they didn't add themselves.
+    proxies = settings.THROTTLE_NUM_PROXIES
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',')]
+        return addresses[-min(proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _submitted(request):
+    data = getattr(request, 'data', None)
+    if data is None:
+        data = request.POST
+    # A JSON body may be a list or a scalar; the view rejects those itself.
+    if not isinstance(data, Mapping):
+        return None
+    for field in EMAIL_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str) and value.strip():
+            return value.strip().lower()
+    return None
+
+
+def identity(request, kind):
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'user':
+        user = getattr(request, 'user', None)
+        return f'u{user.pk}' if user is not None and user.is_authenticated else client_ip(request)
+    if kind == 'email':
+        return _submitted(request)
+    raise ValueError(f'Unknown throttle identity {kind!r}.')
+
+
+def _retry_after(previous, count, limit, period, offset):
+    """Seconds until one more request fits, given counts that already exceed the limit."""
+    if count >= limit:
+        # Wait for this window to become the previous one and fade enough.
+        wait = period - offset + period * (1 - (limit - 1) / count)
+    else:
+        wait = period * (1 - (limit - 1 - count) / previous) - offset
+    return max(1, math.ceil(wait))
+
+
+def hit(scope, kind, ident, rate, now=None):
+    """Count a request. Returns None when it is within ``rate``, otherwise the seconds to wait."""
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window, offset = divmod(now, period)
+    digest = hashlib.md5(ident.encode(), usedforsecurity=False).hexdigest()
+    key = COUNT_KEY.format(scope, kind, digest, int(window))
+    previous = cache.get(COUNT_KEY.format(scope, kind, digest, int(window) - 1), 0)
+    cache.add(key, 0, timeout=2 * period)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.set(key, 1, timeout=2 * period)
+        count = 1
+    if previous * (1 - offset / period) + count <= limit:
+        return None
+    return _retry_after(previous, count, limit, period, offset)
+
+
+def check(request, scope):
+    """
+    Count the request against every limit of ``scope``. Returns None when it
+    is allowed, otherwise the seconds to wait (the longest of the limits hit).
+    """
+    waits = []
+    for kind, rate in settings.THROTTLE_RATES.get(scope, {}).items():
+        ident = identity(request, kind)
+        if ident is None:
+            continue
+        wait = hit(scope, kind, ident, rate)
+        if wait is not None:
+            record_rejection(f'{scope}:{kind}')
+            waits.append(wait)
+    return max(waits) if waits else None
+
+
+def record_rejection(label):
+    labels = cache.get(REJECTED_LABELS_KEY, ())
+    if label not in labels:
+        cache.set(REJECTED_LABELS_KEY, tuple(sorted({*labels, label})), timeout=None)
+    key = REJECTED_KEY.format(label)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_rejections():
+    """{'scope:kind': rejected requests} since the last reset."""
+    labels = cache.get(REJECTED_LABELS_KEY, ())
+    values = cache.get_many([REJECTED_KEY.format(label) for label in labels])
+    return {label: values.get(REJECTED_KEY.format(label), 0) for label in labels}
+
+
+def reset_rejections():
+    labels = cache.get(REJECTED_LABELS_KEY, ())
+    cache.delete_many([REJECTED_KEY.format(label) for label in labels])
+    cache.delete(REJECTED_LABELS_KEY)
+
+
+def _enabled(scope, method, methods):
+    return settings.THROTTLE_ENABLED and scope is not None and method in methods
+
+
+class ScopeThrottle(BaseThrottle):
+    """
+    DRF throttle for views (or actions) that set ``throttle_scope``; other
+    views pass through without touching the cache. DRF answers 429 with
+    Retry-After from ``wait()``.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        methods = getattr(view, 'throttle_methods', ('POST',))
+        if not _enabled(scope, request.method, methods):
+            return True
+        self.retry_after = check(request, scope)
+        return self.retry_after is None
+
+    def wait(self):
+        return self.retry_after
+
+
+class ThrottleMixin:
+    """The same limits for plain Django views."""
+    throttle_scope = None
+    throttle_methods = ('POST',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if _enabled(self.throttle_scope, request.method, self.throttle_methods):
+            retry_after = check(request, self.throttle_scope)
+            if retry_after is not None:
+                response = HttpResponse('Too many requests. Please try again later.', status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,37 @@
+// Typeahead suggestions for the search box in the navbar
+(function () {
+    var input = document.getElementById('search-input');
+    if (!input) {
+        return;
+    }
+    var list = document.getElementById(input.getAttribute('list'));
+    var url = input.dataset.autocompleteUrl;
+    var timer = null;
+    var lastQuery = '';
+
+    function render(data) {
+        list.innerHTML = '';
+        ['books', 'authors', 'tags'].forEach(function (kind) {
+            (data[kind] || []).forEach(function (item) {
+                var option = document.createElement('option');
+                option.value = item.label;
+                list.appendChild(option);
+            });
+        });
+    }
+
+    input.addEventListener('input', function () {
+        var query = input.value.trim();
+        clearTimeout(timer);
+        if (query.length < 2 || query === lastQuery) {
+            return;
+        }
+        timer = setTimeout(function () {
+            lastQuery = query;
+            fetch(url + '?q=' + encodeURIComponent(query), {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.ok ? response.json() : {}; })
+                .then(render)
+                .catch(function () {});
+        }, 150);
+    });
+})();
@@ -0,0 +1,43 @@
+// Appends the next page of comments; the server hands back a cursor for the page after it
+function loadMoreComments() {
+    var button = document.getElementById('load-more-btn');
+    var cursor = button.dataset.cursor;
+    if (!cursor) {
+        button.style.display = 'none';
+        return;
+    }
+
+    fetch(button.dataset.url + '?cursor=' + encodeURIComponent(cursor), {headers: {'Accept': 'application/json'}})
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+            var container = document.getElementById('comments-container');
+            (data.comments || []).forEach(function (comment) {
+                var wrapper = document.createElement('div');
+                wrapper.className = 'comment';
+
+                var header = document.createElement('div');
+                header.className = 'comment-header';
+                var author = document.createElement('strong');
+                author.textContent = comment.username;
+                header.appendChild(author);
+
+                var content = document.createElement('p');
+                content.className = 'comment-content';
+                content.textContent = comment.content + (comment.is_modified ? ' (Modified)' : '');
+
+                var published = document.createElement('p');
+                published.innerHTML = '<small></small>';
+                published.firstChild.textContent = 'Published ' + comment.created_at;
+
+                wrapper.appendChild(header);
+                wrapper.appendChild(content);
+                wrapper.appendChild(published);
+                container.appendChild(wrapper);
+            });
+
+            button.dataset.cursor = data.next_cursor || '';
+            if (!data.next_cursor) {
+                button.style.display = 'none';
+            }
+        });
+}
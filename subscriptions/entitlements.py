@@ -0,0 +1,64 @@
+from array import array
+from bisect import bisect_left
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Subscription, BookPurchase
+
+CACHE_TIMEOUT = 60 * 60
+
+
+class Entitlements:
+    __slots__ = ('subscription_expires_at', 'book_ids')
+
+    def __init__(self, subscription_expires_at=None, book_ids=()):
+        self.subscription_expires_at = subscription_expires_at
+        self.book_ids = array('q', sorted(book_ids))
+
+    def __getstate__(self):
+        return self.subscription_expires_at, self.book_ids.tobytes()
+
+    def __setstate__(self, state):
+        self.subscription_expires_at, raw = state
+        self.book_ids = array('q')
+        self.book_ids.frombytes(raw)
+
+    @property
+    def has_active_subscription(self):
+        return self.subscription_expires_at is not None and self.subscription_expires_at > timezone.now()
+
+    def has_purchased(self, book_id):
+        pos = bisect_left(self.book_ids, book_id)
+        return pos < len(self.book_ids) and self.book_ids[pos] == book_id
+
+    def can_view(self, book_id):
+        return self.has_active_subscription or self.has_purchased(book_id)
+
+
+def _cache_key(user_id):
+    return f'subscriptions:entitlements:{user_id}'
+
+
+def load_entitlements(user_id):
+    expires_at = Subscription.objects.filter(user_id=user_id).values_list('end_date', flat=True).first()
+    book_ids = BookPurchase.objects.filter(user_id=user_id).values_list('book_id', flat=True)
+    return Entitlements(expires_at, book_ids)
+
+
+def get_entitlements(user):
+    if not user.is_authenticated:
+        return Entitlements()
+
+    # Memoized on the user object, so one request never asks the cache twice.
+    entitlements = getattr(user, '_entitlements', None)
+    if entitlements is None:
+        key = _cache_key(user.pk)
+        entitlements = cache.get(key)
+        if entitlements is None:
+            entitlements = load_entitlements(user.pk)
+            cache.set(key, entitlements, CACHE_TIMEOUT)
+        user._entitlements = entitlements
+    return entitlements
+
+
+def invalidate_entitlements(user_id):
+    cache.delete(_cache_key(user_id))
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from librarysite.cache import bump_on_commit
+from .entitlements import invalidate_entitlements
+from .models import Subscription, BookPurchase, SubscriptionPlan
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=BookPurchase)
+@receiver(post_delete, sender=BookPurchase)
+def entitlements_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_entitlements(user_id))
+
+
+@receiver(post_save, sender=BookPurchase)
+@receiver(post_delete, sender=BookPurchase)
+def purchase_changed(sender, instance, created=True, raw=False, **kwargs):
+    from books.popularity import record_on_commit
+    from books.signals import schedule_related_refresh
+
+    if raw or not created:
+        return
+    schedule_related_refresh(instance.user_id, instance.book_id)
+    if kwargs['signal'] is post_save:
+        record_on_commit(instance.book_id, 'purchase')
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def plan_changed(sender, **kwargs):
+    bump_on_commit('plans')
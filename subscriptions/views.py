@@ -11,6 +11,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.utils import timezone
+from librarysite import cache as site_cache
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 stripe.api_version = settings.STRIPE_API_VERSION
@@ -22,7 +23,7 @@ class SubscriptionsList(ListView):
     context_object_name = 'subs'
 
     def get_queryset(self):
-        return SubscriptionPlan.objects.all()
+        return site_cache.get_or_set('plans', 'all', lambda: list(SubscriptionPlan.objects.all()))
 
 
 class SubscriptionView(TemplateView):